@@ -10,6 +10,12 @@ import dotenv
 from model.base import Base
 # noinspection PyUnresolvedReferences
 from model.subscription import Subscription
+# noinspection PyUnresolvedReferences
+from model.known_handle import KnownHandle
+# noinspection PyUnresolvedReferences
+from model.subscription_filter import SubscriptionFilter
+# noinspection PyUnresolvedReferences
+from model.pending_digest_post import PendingDigestPost
 
 dotenv.load_dotenv()
 # this is the Alembic Config object, which provides
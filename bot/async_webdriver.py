@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar, Any
+
+from selenium.common import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+T = TypeVar("T")
+
+
+class AsyncWebDriver:
+    """ Runs every call of a WebDriver session on a thread of its own, so that page loads and screenshots never block
+    the event loop (and with it the firehose).
+
+    Every call is awaited with a timeout; a call that times out raises selenium's TimeoutException, so it's handled
+    like any other WebDriverException. Cancelling an awaiting coroutine drops its call if it hasn't started yet; a
+    call already running on the session's thread can't be interrupted, though. Once a call timed out, the session is
+    considered broken, as all further calls would queue up behind the hung one: it has to be quit and replaced by a
+    new session. """
+
+    def __init__(self, driver: WebDriver, executor: ThreadPoolExecutor, timeout_s: float = 60.0):
+        self.driver = driver
+        self.broken = False
+        self._executor = executor
+        self._timeout_s = timeout_s
+
+    @staticmethod
+    async def create(factory: Callable[[], WebDriver], timeout_s: float = 60.0) -> 'AsyncWebDriver':
+        """ Starts a session by calling factory (e.g. webdriver.Chrome with its options) on the session's thread """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webdriver")
+        try:
+            driver = await AsyncWebDriver._run(executor, factory, timeout_s)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return AsyncWebDriver(driver, executor, timeout_s)
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor, function: Callable[..., T], timeout_s: Optional[float], *args) -> T:
+        future = asyncio.get_running_loop().run_in_executor(executor, functools.partial(function, *args))
+        try:
+            return await asyncio.wait_for(future, timeout_s)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"{getattr(function, '__name__', function)} timed out after {timeout_s}s")
+
+    async def call(self, function: Callable[..., T], *args: Any, timeout_s: Optional[float] = None) -> T:
+        """ Calls function(*args) on the session's thread, e.g. call(element.click) """
+        try:
+            return await AsyncWebDriver._run(
+                self._executor, function, timeout_s if timeout_s is not None else self._timeout_s, *args
+            )
+        except TimeoutException:
+            self.broken = True
+            raise
+
+    async def get(self, url: str):
+        await self.call(self.driver.get, url)
+
+    async def find_element(self, by: str, value: str) -> WebElement:
+        return await self.call(self.driver.find_element, by, value)
+
+    async def click(self, element: WebElement):
+        await self.call(element.click)
+
+    async def send_keys(self, element: WebElement, text: str):
+        await self.call(element.send_keys, text)
+
+    async def element_screenshot_as_png(self, by: str, value: str) -> bytes:
+        return await self.call(lambda: self.driver.find_element(by, value).screenshot_as_png)
+
+    async def screenshot_as_png(self) -> bytes:
+        return await self.call(self.driver.get_screenshot_as_png)
+
+    async def quit(self, timeout_s: float = 10.0):
+        """ Ends the session; the one of a broken session is ended from a thread of its own, as its thread is hung """
+        executor = self._executor
+        if self.broken:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="webdriver-quit")
+        try:
+            await AsyncWebDriver._run(executor, self.driver.quit, timeout_s)
+        except Exception as e:
+            logging.warning(f"Quitting the browser failed: {e}")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor.shutdown(wait=False, cancel_futures=True)
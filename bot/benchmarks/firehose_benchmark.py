@@ -0,0 +1,280 @@
+""" Offline throughput benchmarks for the firehose observer and the distribution path.
+
+Run from within the bot directory, e.g.
+
+    python -m benchmarks.firehose_benchmark record --output firehose.log --duration 60
+    python -m benchmarks.firehose_benchmark synthesize --output synthetic.log --frames 50000
+    python -m benchmarks.firehose_benchmark observer --log firehose.log
+    python -m benchmarks.firehose_benchmark distribution --log firehose.log --subscriptions 5000
+    python -m benchmarks.firehose_benchmark post_memory --log firehose.log
+    python -m benchmarks.firehose_benchmark decode --log firehose.log
+"""
+import argparse
+import asyncio
+import random
+import resource
+import time
+import tracemalloc
+from typing import List, Optional
+
+from bsky.bsky_account_observer import BskyPostObserver
+from bsky.firehose_replay import FirehoseRecorder, RecordingFirehoseSubscribeReposClient, SyntheticFrameGenerator, \
+    read_recorded_frames, replay_frames
+from bsky.observed_bsky_post import ObservedBlueSkyPost
+from event_loop import event_loop
+
+
+def _rss_mib() -> float:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _report(name: str, elapsed_s: float, **counts: int):
+    print(f"[{name}] {elapsed_s:.3f}s")
+    for label, count in counts.items():
+        print(f"  {label}: {count} ({count / elapsed_s:.1f}/s)")
+    if tracemalloc.is_tracing():
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"  traced peak: {peak / 1024 / 1024:.2f} MiB, max RSS: {_rss_mib():.2f} MiB")
+
+
+def _frames(args: argparse.Namespace):
+    if args.log:
+        return list(read_recorded_frames(args.log))
+    return list(SyntheticFrameGenerator(seed=args.seed).frames(args.frames))
+
+
+async def _record(args: argparse.Namespace):
+    recorder = FirehoseRecorder(args.output)
+    firehose = RecordingFirehoseSubscribeReposClient(recorder, base_uri="wss://bsky.network/xrpc")
+
+    async def ignore(_):
+        return None
+
+    async def stop_later():
+        await asyncio.sleep(args.duration)
+        await firehose.stop()
+
+    stopper = asyncio.ensure_future(stop_later())
+    try:
+        await firehose.start(ignore)
+    finally:
+        stopper.cancel()
+        recorder.close()
+    print(f"Recorded {recorder.frames_written} frames to {args.output}")
+
+
+async def _collect_observed_posts(frames, speed: Optional[float]) -> tuple[int, List[ObservedBlueSkyPost], float]:
+    observer = BskyPostObserver()
+    collected: List[ObservedBlueSkyPost] = []
+    subscription = observer.posts(schedule_s=0.5, capacity=250).subscribe(on_next=collected.extend)
+    # posts() subscribes on the event loop's scheduler, so give it a chance to do so before replaying
+    await asyncio.sleep(0.1)
+    started_at = time.perf_counter()
+    replayed = await replay_frames(iter(frames), observer.process_firehose_message, speed=speed)
+    elapsed = time.perf_counter() - started_at
+    # let the buffer flush its remainder; not part of the measurement
+    await asyncio.sleep(1.0)
+    subscription.dispose()
+    return replayed, collected, elapsed
+
+
+async def _observer(args: argparse.Namespace):
+    frames = _frames(args)
+    tracemalloc.start()
+    replayed, posts, elapsed = await _collect_observed_posts(frames, speed=args.speed)
+    _report("observer", elapsed, frames=replayed, posts=len(posts))
+    tracemalloc.stop()
+
+
+class _EagerPost:
+    """ The former dict based post representation with eagerly formatted URLs, kept for comparison """
+
+    def __init__(self, commit_repo: str, text: str, content_identifier: str):
+        self.commit_repo = commit_repo
+        self.text = text
+        self.atproto_uri = f"at://{commit_repo}/app.bsky.feed.post/{content_identifier}"
+        self.http_url_to_post = f"https://bsky.app/profile/{commit_repo}/post/{content_identifier}"
+        self.profile_url = f"https://bsky.app/profile/{commit_repo}"
+        self.content_identifier = content_identifier
+
+
+def _footprint(factory, fields: List[tuple[str, str, str]]) -> float:
+    """ Average number of bytes retained per post created by factory; the texts themselves are not accounted for """
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    # copy the strings the firehose would hand out fresh per frame, just as enqueue would receive them
+    retained = [factory("".join(repo), text, "".join(rkey)) for repo, text, rkey in fields]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(retained)
+
+
+async def _post_memory(args: argparse.Namespace):
+    _, posts, elapsed = await _collect_observed_posts(_frames(args), speed=args.speed)
+    if not posts:
+        print("No posts in the replayed frames")
+        return
+    fields = [(post.commit_repo, post.text, post.content_identifier) for post in posts]
+    posts_per_second = len(posts) / elapsed
+    for name, factory in (
+            ("eager", lambda repo, text, rkey: _EagerPost(commit_repo=repo, text=text, content_identifier=rkey)),
+            ("slotted", lambda repo, text, rkey: ObservedBlueSkyPost(
+                commit_repo=repo, content_identifier=rkey, text=text
+            )),
+    ):
+        footprint = _footprint(factory, fields)
+        print(f"[{name}] {footprint:.1f} bytes/post")
+        print(f"  {posts_per_second:.1f} post allocations/s, {footprint * posts_per_second / 1024:.1f} KiB/s")
+        print(f"  {footprint * 250 / 1024:.1f} KiB per full buffer of 250 posts")
+
+
+def _model_based_post_count(message) -> int:
+    """ The former enqueue implementation: validates every commit and every created record into atproto models """
+    from atproto import models, CAR
+    from atproto_client.models import get_or_create
+    from atproto_firehose import parse_subscribe_repos_message
+
+    commit = parse_subscribe_repos_message(message)
+    if not isinstance(commit, models.ComAtprotoSyncSubscribeRepos.Commit) or not commit.blocks:
+        return 0
+    car = CAR.from_bytes(commit.blocks)
+    count = 0
+    for op in commit.ops:
+        if op.action != 'create' or op.path.startswith("blue.place.pixel"):
+            continue
+        record_raw_data = car.blocks.get(op.cid)
+        if not record_raw_data:
+            continue
+        record = get_or_create(record_raw_data, strict=False)
+        if record and record.py_type == "app.bsky.feed.post":
+            count += 1
+    return count
+
+
+async def _decode(args: argparse.Namespace):
+    from atproto_client.models import get_or_create
+    from atproto_firehose.models import Frame, MessageFrame
+
+    from bsky.post_record_decoder import decode_post_record
+
+    messages = [frame for frame in (Frame.from_bytes(data) for _, data in _frames(args))
+                if isinstance(frame, MessageFrame)]
+
+    started_at = time.perf_counter()
+    posts = sum(_model_based_post_count(message) for message in messages)
+    _report("frames, atproto models", time.perf_counter() - started_at, frames=len(messages), posts=posts)
+
+    observer = BskyPostObserver()
+    collected: List[ObservedBlueSkyPost] = []
+    subscription = observer._subject.subscribe(on_next=collected.append)
+    started_at = time.perf_counter()
+    for message in messages:
+        observer.enqueue(message)
+    _report("frames, op filter & raw decoding", time.perf_counter() - started_at,
+            frames=len(messages), posts=len(collected))
+    subscription.dispose()
+
+    records = [{
+        "$type": "app.bsky.feed.post",
+        "text": post.text,
+        "createdAt": "2024-11-24T12:00:00.000Z",
+        "langs": ["en"],
+    } for post in collected]
+    if not records:
+        return
+    started_at = time.perf_counter()
+    for record in records:
+        get_or_create(record, strict=False)
+    _report("records, get_or_create", time.perf_counter() - started_at, records=len(records))
+    started_at = time.perf_counter()
+    for record in records:
+        decode_post_record(record)
+    _report("records, decode_post_record", time.perf_counter() - started_at, records=len(records))
+
+
+async def _distribution(args: argparse.Namespace):
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    from distribution_main import find_subscriptions, posts_by_subscription
+    from model.base import Base
+    from model.subscription import Subscription
+
+    _, posts, _ = await _collect_observed_posts(_frames(args), speed=None)
+    if not posts:
+        print("No posts in the replayed frames")
+        return
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        repos = list({post.commit_repo for post in posts})
+        randomness = random.Random(args.seed)
+        await connection.execute(insert(Subscription), [
+            {"chat_id": randomness.randrange(args.chats), "did": randomness.choice(repos)}
+            for _ in range(args.subscriptions)
+        ])
+    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    tracemalloc.start()
+    deliveries = 0
+    started_at = time.perf_counter()
+    for index in range(0, len(posts), args.batch_size):
+        batch = posts[index:index + args.batch_size]
+        async with async_session() as sql_session:
+            subscriptions = await find_subscriptions(sql_session, batch)
+        deliveries += sum(1 for _ in posts_by_subscription(batch, subscriptions))
+    elapsed = time.perf_counter() - started_at
+    _report("distribution", elapsed, posts=len(posts), deliveries=deliveries)
+    tracemalloc.stop()
+    await engine.dispose()
+
+
+def _synthesize(args: argparse.Namespace):
+    SyntheticFrameGenerator(seed=args.seed).write_log(args.output, args.frames, frames_per_second=args.rate)
+    print(f"Wrote {args.frames} synthetic frames to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="Record the live firehose")
+    record.add_argument("--output", required=True)
+    record.add_argument("--duration", type=float, default=60.0, help="Seconds to record")
+
+    synthesize = commands.add_parser("synthesize", help="Write a synthetic firehose log")
+    synthesize.add_argument("--output", required=True)
+    synthesize.add_argument("--frames", type=int, default=50000)
+    synthesize.add_argument("--rate", type=float, default=1000.0, help="Frames per second of the synthetic log")
+    synthesize.add_argument("--seed", type=int, default=0)
+
+    for name in ("observer", "distribution", "post_memory", "decode"):
+        benchmark = commands.add_parser(name)
+        benchmark.add_argument("--log", help="Firehose log to replay; synthetic frames are used if omitted")
+        benchmark.add_argument("--frames", type=int, default=20000, help="Number of synthetic frames")
+        benchmark.add_argument("--speed", type=float, default=None, help="Replay speed; as fast as possible if omitted")
+        benchmark.add_argument("--seed", type=int, default=0)
+    distribution = commands.choices["distribution"]
+    distribution.add_argument("--subscriptions", type=int, default=5000)
+    distribution.add_argument("--chats", type=int, default=500)
+    distribution.add_argument("--batch-size", type=int, default=250)
+
+    args = parser.parse_args()
+    if args.command == "synthesize":
+        _synthesize(args)
+        return
+    command = {
+        "record": _record,
+        "observer": _observer,
+        "distribution": _distribution,
+        "post_memory": _post_memory,
+        "decode": _decode,
+    }[args.command]
+    asyncio.set_event_loop(event_loop)
+    event_loop.run_until_complete(command(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+""" Hydrates batches of posts against a local XRPC stand-in and reports how many API calls it took.
+
+    python -m benchmarks.hydration_replay --posts 250 --batches 4 --reply-ratio 0.5
+
+serves com.atproto.server.createSession and app.bsky.feed.getPosts locally, answering with generated post views
+(with replies, quotes and image alt texts), and hydrates --batches batches of --posts posts each through the
+PostHydrator. With --serve-only the stand-in just keeps running, e.g. to point the distribution at it via
+POST_HYDRATION_XRPC=http://localhost:8082/xrpc.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+from aiohttp import web
+
+from bsky.bluesky_credentials import BlueSkyCredentials
+from bsky.bsky_api_extensions import close_client_session
+from bsky.credential_pool import CredentialPool
+from bsky.observed_bsky_post import POST_COLLECTION
+from bsky.post_hydrator import PostHydrator, GET_POSTS_LIMIT
+
+ACCESS_TOKEN = "stand-in-access-token"
+
+
+class XrpcStandIn:
+
+    def __init__(self, reply_ratio: float, quote_ratio: float, image_ratio: float, seed: int):
+        self.sessions = 0
+        self.get_posts_calls = 0
+        self.requested_uris = 0
+        self._reply_ratio = reply_ratio
+        self._quote_ratio = quote_ratio
+        self._image_ratio = image_ratio
+        self._seed = seed
+
+    async def create_session(self, request: web.Request) -> web.Response:
+        self.sessions += 1
+        body = await request.json()
+        return web.json_response({
+            "did": "did:plc:standin", "handle": body.get("identifier"),
+            "accessJwt": ACCESS_TOKEN, "refreshJwt": "stand-in-refresh-token"
+        })
+
+    async def get_posts(self, request: web.Request) -> web.Response:
+        if request.headers.get("Authorization") != f"Bearer {ACCESS_TOKEN}":
+            return web.json_response({"error": "AuthMissing"}, status=401)
+        uris = request.query.getall("uris", [])
+        if len(uris) > GET_POSTS_LIMIT:
+            return web.json_response({"error": "InvalidRequest"}, status=400)
+        self.get_posts_calls += 1
+        self.requested_uris += len(uris)
+        return web.json_response({"posts": [self._view(uri) for uri in uris]})
+
+    def _view(self, uri: str) -> dict:
+        # the same URI always gets the same view
+        randomizer = random.Random(f"{self._seed} {uri}")
+        did = uri.split("/")[2]
+        record = {"$type": POST_COLLECTION, "text": f"Text of {uri}", "createdAt": "2024-11-24T12:00:00.000Z"}
+        if randomizer.random() < self._reply_ratio:
+            parent = f"at://{_did(randomizer)}/{POST_COLLECTION}/{randomizer.randrange(10 ** 6)}"
+            record["reply"] = {"parent": {"uri": parent, "cid": "bafy"}, "root": {"uri": parent, "cid": "bafy"}}
+        view = {"uri": uri, "cid": "bafy", "author": {"did": did, "handle": f"{did[8:16]}.bsky.social"},
+                "record": record}
+        quoted = None
+        if randomizer.random() < self._quote_ratio:
+            quoted_did = _did(randomizer)
+            quoted = {
+                "$type": "app.bsky.embed.record#viewRecord",
+                "uri": f"at://{quoted_did}/{POST_COLLECTION}/{randomizer.randrange(10 ** 6)}",
+                "author": {"did": quoted_did, "handle": f"{quoted_did[8:16]}.bsky.social"},
+                "value": {"$type": POST_COLLECTION, "text": "A quoted post"}
+            }
+        images = None
+        if randomizer.random() < self._image_ratio:
+            images = {"$type": "app.bsky.embed.images#view", "images": [
+                {"alt": f"Image {index}", "thumb": "", "fullsize": ""} for index in range(randomizer.randint(1, 4))
+            ]}
+        if quoted is not None and images is not None:
+            view["embed"] = {"$type": "app.bsky.embed.recordWithMedia#view", "record": {"record": quoted},
+                             "media": images}
+        elif quoted is not None:
+            view["embed"] = {"$type": "app.bsky.embed.record#view", "record": quoted}
+        elif images is not None:
+            view["embed"] = images
+        return view
+
+    async def start(self, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post("/xrpc/com.atproto.server.createSession", self.create_session)
+        app.router.add_get("/xrpc/app.bsky.feed.getPosts", self.get_posts)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host="127.0.0.1", port=port).start()
+        return runner
+
+
+def _did(randomizer: random.Random) -> str:
+    return "did:plc:" + "".join(randomizer.choices("abcdefghijklmnopqrstuvwxyz234567", k=24))
+
+
+def _batch(randomizer: random.Random, repos: List[str], size: int) -> List[str]:
+    return [f"at://{randomizer.choice(repos)}/{POST_COLLECTION}/{randomizer.randrange(10 ** 6)}" for _ in range(size)]
+
+
+async def _replay(args: argparse.Namespace):
+    stand_in = XrpcStandIn(args.reply_ratio, args.quote_ratio, args.image_ratio, args.seed)
+    runner = await stand_in.start(args.port)
+    if args.serve_only:
+        print(f"Serving XRPC stand-in on http://127.0.0.1:{args.port}/xrpc")
+        await asyncio.Event().wait()
+    pool = CredentialPool([BlueSkyCredentials(user_name="observer.stand-in", password="password")])
+    hydrator = PostHydrator(pool, xrpc=f"http://127.0.0.1:{args.port}/xrpc")
+    randomizer = random.Random(args.seed)
+    repos = [_did(randomizer) for _ in range(args.repos)]
+    batches = [_batch(randomizer, repos, args.posts) for _ in range(args.batches)]
+    # repeat the first batch, as happens when a post is delivered to chats in several batches
+    batches.append(batches[0])
+
+    durations = []
+    hydrated_count = replies = quotes = alts = 0
+    for batch in batches:
+        started_at = time.perf_counter()
+        hydrated = await hydrator.hydrate(batch)
+        durations.append(time.perf_counter() - started_at)
+        hydrated_count += sum(1 for uri in batch if uri in hydrated)
+        for uri in batch:
+            post = hydrated.get(uri)
+            if post is None:
+                continue
+            replies += post.reply_parent_uri is not None and post.reply_parent_uri in hydrated
+            quotes += post.quoted is not None
+            alts += bool(post.image_alts)
+    await close_client_session()
+    await runner.cleanup()
+
+    posts = args.posts * len(batches)
+    print(f"Hydrated {hydrated_count} of {posts} posts in {len(batches)} batches")
+    print(f"  {stand_in.get_posts_calls} getPosts calls ({posts / max(1, stand_in.get_posts_calls):.1f} posts per call), "
+          f"{stand_in.sessions} session(s), {hydrator.cache_hits} cache hits")
+    print(f"  with reply context: {replies}, quotes: {quotes}, image alt texts: {alts}")
+    print(f"  per batch: {', '.join(f'{duration * 1000:.0f} ms' for duration in durations)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--posts", type=int, default=250, help="Posts per batch")
+    parser.add_argument("--batches", type=int, default=4)
+    parser.add_argument("--repos", type=int, default=50)
+    parser.add_argument("--reply-ratio", type=float, default=0.5)
+    parser.add_argument("--quote-ratio", type=float, default=0.1)
+    parser.add_argument("--image-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--serve-only", action="store_true")
+    asyncio.run(_replay(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
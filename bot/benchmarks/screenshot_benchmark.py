@@ -0,0 +1,78 @@
+""" Measures how much the screenshot encoding saves over the webdriver's PNG screenshots.
+
+    python -m benchmarks.screenshot_benchmark --directory screenshots --format jpeg --quality 80
+
+encodes every PNG in the directory (synthetic post-like screenshots if --directory is omitted) and reports the size
+reduction and the encoding time per image.
+"""
+import argparse
+import glob
+import io
+import os
+import random
+import statistics
+import time
+from typing import List
+
+from PIL import Image, ImageDraw
+
+from screenshot_encoder import ScreenshotEncoder, FORMATS
+
+
+def _synthetic_screenshots(count: int, width: int, height: int, seed: int) -> List[bytes]:
+    randomizer = random.Random(seed)
+    screenshots = []
+    for _ in range(count):
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((16, 16, 64, 64), fill=tuple(randomizer.randrange(256) for _ in range(3)))
+        for line in range(randomizer.randint(3, 12)):
+            y = 80 + line * 24
+            draw.text((16, y), " ".join(
+                "".join(randomizer.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(randomizer.randint(2, 9)))
+                for _ in range(randomizer.randint(4, 10))
+            ), fill="black")
+        if randomizer.random() < 0.5:
+            # an embedded image, which compresses far worse than text
+            noise = Image.effect_noise((width - 32, height // 3), randomizer.randint(20, 80)).convert("RGB")
+            image.paste(noise, (16, height - height // 3 - 16))
+        output = io.BytesIO()
+        image.save(output, "PNG")
+        screenshots.append(output.getvalue())
+    return screenshots
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--directory", default=None, help="Directory of PNG screenshots")
+    parser.add_argument("--format", default="jpeg", choices=list(FORMATS))
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--max-width", type=int, default=1280)
+    parser.add_argument("--count", type=int, default=50, help="Number of synthetic screenshots")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.directory:
+        screenshots = []
+        for path in sorted(glob.glob(os.path.join(args.directory, "*.png"))):
+            with open(path, "rb") as file:
+                screenshots.append(file.read())
+    else:
+        screenshots = _synthetic_screenshots(args.count, 600, 800, args.seed)
+    if not screenshots:
+        parser.error("No screenshots to encode")
+
+    encoder = ScreenshotEncoder(image_format=args.format, quality=args.quality, max_width=args.max_width)
+    durations = []
+    for screenshot in screenshots:
+        started_at = time.perf_counter()
+        encoder.encode(screenshot)
+        durations.append(time.perf_counter() - started_at)
+    print(f"Encoded {encoder.encoded} screenshots as {args.format} (quality {args.quality})")
+    print(f"  {encoder.original_bytes / encoder.encoded / 1024:.1f} KiB -> "
+          f"{encoder.encoded_bytes / encoder.encoded / 1024:.1f} KiB per image ({encoder.saved_ratio:.0%} saved)")
+    print(f"  encoding: median {statistics.median(durations) * 1000:.1f} ms, max {max(durations) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+""" Measures import time and memory of every EXEC_MODE at startup, each in a fresh interpreter.
+
+Run from within the bot directory:
+
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from main import EXEC_MODES
+
+_PROBE = """
+import json, resource, sys, time
+started_at = time.perf_counter()
+import importlib
+module = importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - started_at
+heavy = [name for name in ("selenium", "telegram", "atproto_client", "atproto_firehose", "reactivex", "sqlalchemy")
+         if name in sys.modules]
+print(json.dumps({
+    "import_s": elapsed,
+    "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy": heavy,
+}))
+"""
+
+
+def _probe(module_name: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, module_name],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for exec_mode, (module_name, _) in EXEC_MODES.items():
+        samples = [_probe(module_name) for _ in range(args.runs)]
+        import_s = [sample["import_s"] for sample in samples]
+        rss_mib = [sample["max_rss_kib"] / 1024 for sample in samples]
+        print(f"[{exec_mode}] {module_name}")
+        print(f"  import: median {statistics.median(import_s) * 1000:.0f} ms, max {max(import_s) * 1000:.0f} ms")
+        print(f"  max RSS: median {statistics.median(rss_mib):.1f} MiB")
+        print(f"  modules loaded: {samples[-1]['modules']}, heavy dependencies: {', '.join(samples[-1]['heavy'])}")
+
+
+if __name__ == '__main__':
+    main()
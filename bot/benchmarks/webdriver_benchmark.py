@@ -0,0 +1,113 @@
+""" Shows whether the firehose keeps flowing while screenshots are taken.
+
+    python -m benchmarks.webdriver_benchmark --screenshots 5 --page-load 2.0 --fps 500
+
+replays synthetic firehose frames in real time into the observer while a fake, blocking WebDriver takes screenshots,
+once calling the driver straight on the event loop (as before) and once through AsyncWebDriver. For both it reports how
+many frames were processed during the screenshots and how long the event loop stalled at most.
+"""
+import argparse
+import asyncio
+import time
+
+from async_webdriver import AsyncWebDriver
+from bsky.bsky_account_observer import BskyPostObserver
+from bsky.firehose_replay import SyntheticFrameGenerator, replay_frames
+
+
+class BlockingDriver:
+    """ Stands in for a WebDriver session; page loads and screenshots block like the real ones do """
+
+    def __init__(self, page_load_s: float, screenshot_s: float):
+        self._page_load_s = page_load_s
+        self._screenshot_s = screenshot_s
+
+    def get(self, url: str):
+        time.sleep(self._page_load_s)
+
+    def get_screenshot_as_png(self) -> bytes:
+        time.sleep(self._screenshot_s)
+        return b"\x89PNG"
+
+    def quit(self):
+        pass
+
+
+class _LoopLagMonitor:
+
+    def __init__(self, interval_s: float = 0.01):
+        self.interval_s = interval_s
+        self.max_lag_s = 0.0
+
+    async def run(self):
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            self.max_lag_s = max(self.max_lag_s, time.perf_counter() - started_at - self.interval_s)
+
+
+async def _blocking_screenshots(driver: BlockingDriver, count: int):
+    for index in range(count):
+        driver.get(f"https://bsky.app/profile/did:plc:benchmark/post/{index}")
+        await asyncio.sleep(0)
+        driver.get_screenshot_as_png()
+
+
+async def _async_screenshots(driver: BlockingDriver, count: int):
+    browser = await AsyncWebDriver.create(lambda: driver)
+    try:
+        for index in range(count):
+            await browser.get(f"https://bsky.app/profile/did:plc:benchmark/post/{index}")
+            await browser.screenshot_as_png()
+    finally:
+        await browser.quit()
+
+
+async def _run(name: str, screenshots, args: argparse.Namespace):
+    observer = BskyPostObserver()
+    processed = 0
+
+    async def on_message(message):
+        nonlocal processed
+        processed += 1
+        await observer.process_firehose_message(message)
+
+    generator = SyntheticFrameGenerator(seed=args.seed)
+    duration_s = args.screenshots * (args.page_load + args.screenshot) + 1.0
+    frames = generator.frames(int(duration_s * args.fps), frames_per_second=args.fps)
+    monitor = _LoopLagMonitor()
+    monitor_task = asyncio.create_task(monitor.run())
+    replay_task = asyncio.create_task(replay_frames(frames, on_message, speed=1.0))
+    # let the replay get going before the first screenshot
+    await asyncio.sleep(0.1)
+
+    started_at = time.perf_counter()
+    processed_before = processed
+    await screenshots(BlockingDriver(args.page_load, args.screenshot), args.screenshots)
+    elapsed = time.perf_counter() - started_at
+    processed_during = processed - processed_before
+
+    await replay_task
+    monitor_task.cancel()
+    print(f"{name}: {args.screenshots} screenshots in {elapsed:.2f}s")
+    print(f"  frames processed meanwhile: {processed_during} (expected ~{int(elapsed * args.fps)})")
+    print(f"  longest event loop stall: {monitor.max_lag_s * 1000:.0f} ms")
+
+
+async def _benchmark(args: argparse.Namespace):
+    await _run("blocking", _blocking_screenshots, args)
+    await _run("AsyncWebDriver", _async_screenshots, args)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--screenshots", type=int, default=3)
+    parser.add_argument("--page-load", type=float, default=2.0, help="Seconds a page load blocks")
+    parser.add_argument("--screenshot", type=float, default=0.5, help="Seconds a screenshot blocks")
+    parser.add_argument("--fps", type=float, default=500.0, help="Firehose frames per second")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(_benchmark(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
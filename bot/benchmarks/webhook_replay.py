@@ -0,0 +1,151 @@
+""" POSTs recorded Telegram updates to the subscription bot's webhook and measures how fast they're answered.
+
+Replay updates (one JSON encoded update per line; /info commands are generated if --updates is omitted) with
+
+    python -m benchmarks.webhook_replay --secret secret --stand-in-port 8081 --updates updates.jsonl
+
+which serves a local Bot API stand-in and waits for the webhook to come up. Then start the bot in webhook mode
+against the stand-in:
+
+    TELEGRAM_WEBHOOK_PORT=8080 TELEGRAM_WEBHOOK_SECRET=secret TELEGRAM_API_BASE_URL=http://localhost:8081/bot \\
+        python main.py -m manage_subscriptions
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from telegram_webhook import SECRET_TOKEN_HEADER
+
+
+class BotApiStandIn:
+    """ Answers the Bot API calls of the subscription bot locally and records when replies are sent """
+
+    def __init__(self):
+        self.replies: dict[int, float] = {}
+        self._message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stand-In", "username": "stand_in_bot"}
+        elif method in ("sendMessage", "sendPhoto"):
+            self._message_id += 1
+            chat_id = int(params.get("chat_id", 0))
+            self.replies.setdefault(chat_id, time.perf_counter())
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "text": params.get("text", ""),
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post("/{token}/{method}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host="127.0.0.1", port=port).start()
+        return runner
+
+
+def _synthetic_updates(count: int) -> List[dict]:
+    return [{
+        "update_id": index + 1,
+        "message": {
+            "message_id": index + 1,
+            "date": int(time.time()),
+            "chat": {"id": 1000 + index, "type": "private"},
+            "from": {"id": 1000 + index, "is_bot": False, "first_name": "Replay"},
+            "text": "/info",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    } for index in range(count)]
+
+
+def _chat_id(update: dict) -> Optional[int]:
+    message = update.get("message") or update.get("channel_post") or {}
+    return message.get("chat", {}).get("id")
+
+
+async def _wait_for_webhook(session: aiohttp.ClientSession, url: str, timeout: float):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            # the webhook only accepts POST; any response means it's up
+            async with session.get(url):
+                return
+        except aiohttp.ClientConnectionError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.25)
+
+
+async def _replay(args: argparse.Namespace):
+    if args.updates:
+        with open(args.updates) as file:
+            updates = [json.loads(line) for line in file if line.strip()]
+    else:
+        updates = _synthetic_updates(args.count)
+    stand_in = BotApiStandIn()
+    runner = await stand_in.start(args.stand_in_port) if args.stand_in_port else None
+
+    headers = {SECRET_TOKEN_HEADER: args.secret}
+    sent_at: dict[int, float] = {}
+    acknowledgements: List[float] = []
+    async with aiohttp.ClientSession() as session:
+        await _wait_for_webhook(session, args.url, args.timeout)
+
+        async def post(update: dict):
+            started_at = time.perf_counter()
+            sent_at.setdefault(_chat_id(update), started_at)
+            async with session.post(args.url, json=update, headers=headers) as response:
+                response.raise_for_status()
+            acknowledgements.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        await asyncio.gather(*[post(update) for update in updates])
+        elapsed = time.perf_counter() - started_at
+    print(f"Posted {len(updates)} updates in {elapsed:.3f}s ({len(updates) / elapsed:.1f}/s)")
+    print(f"  acknowledged: median {statistics.median(acknowledgements) * 1000:.1f} ms, "
+          f"max {max(acknowledgements) * 1000:.1f} ms")
+
+    if runner is None:
+        return
+    deadline = time.perf_counter() + args.timeout
+    while len(stand_in.replies) < len(sent_at) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    latencies = [stand_in.replies[chat_id] - sent_at[chat_id] for chat_id in sent_at if chat_id in stand_in.replies]
+    print(f"  answered {len(latencies)} of {len(sent_at)} chats")
+    if latencies:
+        print(f"  first reply: median {statistics.median(latencies) * 1000:.1f} ms, "
+              f"max {max(latencies) * 1000:.1f} ms")
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8080/telegram")
+    parser.add_argument("--secret", required=True, help="The bot's TELEGRAM_WEBHOOK_SECRET")
+    parser.add_argument("--updates", default=None, help="File of JSON encoded updates, one per line")
+    parser.add_argument("--count", type=int, default=100, help="Number of synthetic /info updates")
+    parser.add_argument("--stand-in-port", type=int, default=None,
+                        help="Serve a local Bot API stand-in on this port and wait for the bot's replies")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(_replay(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
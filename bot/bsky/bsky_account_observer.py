@@ -1,23 +1,29 @@
 import logging
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
+import libipld
 import reactivex as rx
-from atproto import models, CAR
-from atproto_client.models import get_or_create
-from atproto_firehose import AsyncFirehoseSubscribeReposClient, parse_subscribe_repos_message
+from atproto_firehose import AsyncFirehoseSubscribeReposClient
 from atproto_firehose.models import MessageFrame
 from reactivex import operators as ops
 
-from bsky.observed_bsky_post import ObservedBlueSkyPost
+from bsky.observed_bsky_post import ObservedBlueSkyPost, POST_COLLECTION
+from bsky.post_record_decoder import decode_post_record, collection_of
 from event_loop import event_loop, async_io_scheduler
 
+# Record collections whose create ops are decoded at all; every other op is dropped by its path alone
+OBSERVED_COLLECTIONS = frozenset({POST_COLLECTION})
+# #handle is the deprecated predecessor of #identity, which is still emitted alongside of it
+IDENTITY_MESSAGE_TYPES = frozenset({"#identity", "#handle"})
+
 
 class BskyPostObserver:
     _firehose: Optional[AsyncFirehoseSubscribeReposClient] = None
     _subject: rx.subject.Subject = rx.subject.Subject()
+    _identity_subject: rx.subject.Subject = rx.subject.Subject()
 
-    def __init__(self):
-        pass
+    def __init__(self, collections: frozenset[str] = OBSERVED_COLLECTIONS):
+        self._collections = collections
 
     async def start(self):
         await self.stop()
@@ -43,6 +49,11 @@ class BskyPostObserver:
             ops.subscribe_on(async_io_scheduler)
         )
 
+    def identities(self) -> rx.Observable[Tuple[str, Optional[str]]]:
+        """ Emits (DID, handle) for every identity or handle change on the network.
+        The handle is None if the event only announces that the DID's identity has to be resolved again. """
+        return self._identity_subject
+
     async def process_firehose_message(self, message: MessageFrame):
         # we'll process this in another thread since exceptions might occur if the processing takes too much time
         # (aka fire & forget)
@@ -50,39 +61,37 @@ class BskyPostObserver:
         return None
 
     def enqueue(self, message: MessageFrame):
-        commit = parse_subscribe_repos_message(message)
-        if not isinstance(commit, models.ComAtprotoSyncSubscribeRepos.Commit):
+        # Most of the firehose consists of likes, follows & reposts; filter on the ops' paths before decoding
+        # any blocks and read post records straight from the decoded DAG-CBOR instead of building atproto models
+        if message.type in IDENTITY_MESSAGE_TYPES:
+            self._identity_subject.on_next((message.body["did"], message.body.get("handle")))
+            return
+        if message.type != "#commit":
+            return
+        commit = message.body
+        operations = [
+            op for op in commit.get("ops") or []
+            if op.get("action") == "create" and collection_of(op.get("path", "")) in self._collections
+        ]
+        if not operations:
             return
-        if not commit.blocks:
+        if not commit.get("blocks"):
             logging.info("Commit does not contain any blocks")
             return
-        operations = commit.ops
-        car = CAR.from_bytes(commit.blocks)
+        _, blocks = libipld.decode_car(commit["blocks"])
         for op in operations:
             # ATProto uses so-called ATUris to uniquely identify posts.
             # Let's push them into an observable to collect post URIs into a buffer which then
             # might be able to process multiple posts at once, thus avoiding
             # network throttling by bsky.app
-            if op.action != 'create':
-                continue
-            if op.path.startswith("blue.place.pixel"):
-                continue
-            record_raw_data = car.blocks.get(op.cid)
-            if not record_raw_data:
-                continue
-            record = get_or_create(record_raw_data, strict=False)
-            if not record:
-                logging.warning("get_or_create returned None")
-                continue
-            if record.py_type != "app.bsky.feed.post":
+            record = decode_post_record(blocks.get(op.get("cid")))
+            if record is None:
                 continue
-            url = f"https://bsky.app/profile/{commit.repo}/post/{op.path}".replace("app.bsky.feed.post/", "")
             observed_post = ObservedBlueSkyPost(
-                commit_repo=commit.repo,
+                commit_repo=commit["repo"],
+                content_identifier=op["path"].rpartition("/")[2],
                 text=record.text,
-                atproto_uri=f'at://{commit.repo}/{op.path}',
-                http_url_to_post=url,
-                profile_url=f"https://bsky.app/profile/{commit.repo}",
-                content_identifier=op.path.replace("app.bsky.feed.post/", "")
+                reply_parent_uri=record.reply_parent_uri,
+                created_at=record.created_at
             )
             self._subject.on_next(observed_post)
@@ -1,12 +1,12 @@
 import dataclasses
 import logging
-from typing import Optional, List
+from typing import Optional, List, Mapping
 
 import aiohttp
-from atproto_client import Client
 from dataclass_wizard import fromdict
 
 from bsky.bluesky_credentials import BlueSkyCredentials
+from bsky.credential_pool import RateLimitExceeded, AuthenticationFailed, retry_after_s
 
 
 @dataclasses.dataclass
@@ -23,13 +23,31 @@ class PrefetchUsersResponse:
     actors: List[PrefetchUsersResponseActor]
 
 
+_client_session: Optional[aiohttp.ClientSession] = None
+
+
+def client_session() -> aiohttp.ClientSession:
+    """ The HTTP connection pool shared by all Bluesky API calls of this process """
+    global _client_session
+    if _client_session is None or _client_session.closed:
+        _client_session = aiohttp.ClientSession()
+    return _client_session
+
+
+async def close_client_session():
+    global _client_session
+    if _client_session is not None:
+        await _client_session.close()
+        _client_session = None
+
+
 async def fetch_handle(did: str) -> Optional[str]:
     url = f"https://bsky.social/xrpc/com.atproto.repo.describeRepo?repo={did}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                json = await response.json()
-                return json["handle"]
+        session = client_session()
+        async with session.get(url) as response:
+            json = await response.json()
+            return json["handle"]
     except Exception:
         return None
 
@@ -65,12 +83,24 @@ def get_profile_identifier_and_post_identifier_from_url(url: str) -> tuple[Optio
         return split_post[0], split_post[1]
     return None, None
 
+def logged_in_client(credentials: BlueSkyCredentials):
+    from atproto_client import Client
+    from atproto_client.exceptions import RequestException
+    client = Client()
+    try:
+        client.login(credentials.user_name, credentials.password)
+    except RequestException as e:
+        if e.response is not None:
+            raise_for_rate_limit(e.response.status_code, e.response.headers)
+            raise_for_authentication(e.response.status_code, credentials)
+        raise
+    return client
+
 def get_url_to_parent_if_available(post_url: str, credentials: BlueSkyCredentials) -> Optional[str]:
     profile, post = get_profile_identifier_and_post_identifier_from_url(post_url)
     if profile is None:
         return None
-    client = Client()
-    client.login(credentials.user_name, credentials.password)
+    client = logged_in_client(credentials)
     try:
         record = client.get_post(post_rkey=post, profile_identify=profile)
         if record is None:
@@ -92,8 +122,7 @@ def get_post_info(post_url: str, credentials: BlueSkyCredentials) -> Optional[st
     profile, post = get_profile_identifier_and_post_identifier_from_url(post_url)
     if profile is None:
         return None
-    client = Client()
-    client.login(credentials.user_name, credentials.password)
+    client = logged_in_client(credentials)
     try:
         record = client.get_post(post_rkey=post, profile_identify=profile)
         if record is None:
@@ -107,9 +136,8 @@ def get_post_info(post_url: str, credentials: BlueSkyCredentials) -> Optional[st
             )
             if responding_to_post is None:
                 return message_text
-            responding_to = get_url_to_parent_if_available(post_url, credentials=credentials)
-            if responding_to is None:
-                return message_text
+            # built from the record at hand, as looking it up again would take another login
+            responding_to = f"https://bsky.app/profile/{responding_to_profile}/post/{responding_to_post}"
             message_text = f"Replying to: {responding_to}\n\n{message_text}"
             return message_text
     except:
@@ -122,23 +150,40 @@ async def fetch_did(handle: str) -> Optional[str]:
 
     url = f"https://bsky.social/xrpc/com.atproto.identity.resolveHandle?handle={handle}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                json = await response.json()
-                return json["did"]
+        session = client_session()
+        async with session.get(url) as response:
+            json = await response.json()
+            return json["did"]
     except Exception:
         return None
 
 
-async def fetch_bearer_token(credentials: BlueSkyCredentials) -> Optional[str]:
+def raise_for_rate_limit(status: int, headers: Mapping[str, str]):
+    if status == 429:
+        raise RateLimitExceeded(retry_after_s(headers))
+
+
+def raise_for_authentication(status: int, credentials: BlueSkyCredentials):
+    if status == 401:
+        raise AuthenticationFailed(credentials.user_name)
+
+
+async def fetch_bearer_token(
+        credentials: BlueSkyCredentials,
+        xrpc: str = "https://bsky.social/xrpc"
+) -> Optional[str]:
     if not credentials.user_name or not credentials.password:
         return None
     try:
-        async with aiohttp.ClientSession() as session:
-            data = {"identifier": credentials.user_name, "password": credentials.password}
-            async with session.post("https://bsky.social/xrpc/com.atproto.server.createSession", json=data) as response:
-                json = await response.json()
-                return json['accessJwt']
+        session = client_session()
+        data = {"identifier": credentials.user_name, "password": credentials.password}
+        async with session.post(f"{xrpc}/com.atproto.server.createSession", json=data) as response:
+            raise_for_rate_limit(response.status, response.headers)
+            raise_for_authentication(response.status, credentials)
+            json = await response.json()
+            return json['accessJwt']
+    except (RateLimitExceeded, AuthenticationFailed):
+        raise
     except Exception:
         return None
 
@@ -150,13 +195,79 @@ async def find_users(substring: str, credentials: BlueSkyCredentials) -> Optiona
     if authorization is None:
         return None
     try:
-        async with aiohttp.ClientSession() as session:
-            headers = {'Authorization': f'Bearer {authorization}'}
-            fetch_users = f"https://bsky.social/xrpc/app.bsky.actor.searchActorsTypeahead?term={substring}&limit=10"
-            async with session.get(fetch_users, headers=headers) as response:
-                json = await response.json()
-                return fromdict(PrefetchUsersResponse, json)
+        session = client_session()
+        headers = {'Authorization': f'Bearer {authorization}'}
+        fetch_users = f"https://bsky.social/xrpc/app.bsky.actor.searchActorsTypeahead?term={substring}&limit=10"
+        async with session.get(fetch_users, headers=headers) as response:
+            raise_for_rate_limit(response.status, response.headers)
+            json = await response.json()
+            return fromdict(PrefetchUsersResponse, json)
+    except RateLimitExceeded:
+        raise
     except Exception as e:
         logging.warning("Exception occurred on fetching users")
         logging.warning(e)
         return None
+
+
+PUBLIC_APPVIEW_XRPC = "https://public.api.bsky.app/xrpc"
+LIST_COLLECTION = "app.bsky.graph.list"
+STARTER_PACK_COLLECTION = "app.bsky.graph.starterpack"
+
+
+def get_graph_record_from_url(url: str) -> tuple[Optional[str], Optional[str], Optional[str]]:
+    """ Returns (profile identifier, collection, record key) of a list or starter pack, given either its AT URI
+    or its bsky.app URL, such as https://bsky.app/profile/someone.bsky.social/lists/3kabc """
+    import re
+    patterns = {
+        LIST_COLLECTION: [
+            r'^at://([^/]+)/app\.bsky\.graph\.list/([^/?#]+)',
+            r'^(?:https?://)?(?:www\.)?bsky\.app/profile/([^/]+)/lists/([^/?#]+)',
+        ],
+        STARTER_PACK_COLLECTION: [
+            r'^at://([^/]+)/app\.bsky\.graph\.starterpack/([^/?#]+)',
+            r'^(?:https?://)?(?:www\.)?bsky\.app/starter-pack/([^/]+)/([^/?#]+)',
+        ],
+    }
+    for collection, collection_patterns in patterns.items():
+        for pattern in collection_patterns:
+            match = re.match(pattern, url)
+            if match:
+                return match.group(1), collection, match.group(2)
+    return None, None, None
+
+
+async def fetch_starter_pack_list_uri(starter_pack_uri: str) -> Optional[str]:
+    """ Returns the AT URI of the list backing the given starter pack """
+    url = f"{PUBLIC_APPVIEW_XRPC}/app.bsky.graph.getStarterPack"
+    try:
+        session = client_session()
+        async with session.get(url, params={"starterPack": starter_pack_uri}) as response:
+            json = await response.json()
+            return json["starterPack"]["list"]["uri"]
+    except Exception:
+        return None
+
+
+async def fetch_list_members(list_uri: str, limit: int = 1000) -> Optional[List[tuple[str, str]]]:
+    """ Returns (DID, handle) of up to limit members of the given list """
+    url = f"{PUBLIC_APPVIEW_XRPC}/app.bsky.graph.getList"
+    members: List[tuple[str, str]] = []
+    cursor: Optional[str] = None
+    try:
+        session = client_session()
+        while len(members) < limit:
+            params = {"list": list_uri, "limit": 100}
+            if cursor is not None:
+                params["cursor"] = cursor
+            async with session.get(url, params=params) as response:
+                json = await response.json()
+            members += [(item["subject"]["did"], item["subject"]["handle"]) for item in json["items"]]
+            cursor = json.get("cursor")
+            if not cursor or not json["items"]:
+                break
+    except Exception as e:
+        logging.warning(f"Exception occurred on fetching members of {list_uri}")
+        logging.warning(e)
+        return None
+    return members[:limit]
@@ -0,0 +1,224 @@
+import asyncio
+import enum
+import logging
+import os
+import time
+from typing import Optional, List, Callable, Awaitable, TypeVar, Mapping
+
+from bsky.bluesky_credentials import BlueSkyCredentials
+
+T = TypeVar("T")
+
+
+class Operation(enum.Enum):
+    LOGIN = "login"
+    SEARCH = "search"
+    GET_POST = "getPost"
+    PAGE_LOAD = "page load"
+
+
+# (burst, sustained rate per second) per account, somewhat below Bluesky's published limits, e.g. 30 logins per 5
+# minutes and 300 per day
+DEFAULT_BUDGETS: dict[Operation, tuple[int, float]] = {
+    Operation.LOGIN: (10, 300 / (24 * 60 * 60)),
+    Operation.SEARCH: (30, 1.0),
+    Operation.GET_POST: (50, 5.0),
+    Operation.PAGE_LOAD: (10, 0.2),
+}
+
+
+class RateLimitExceeded(Exception):
+    """ Raised when Bluesky answered a request with 429; retry_after_s is derived from its ratelimit headers """
+
+    def __init__(self, retry_after_s: Optional[float] = None):
+        super().__init__(f"Rate limit exceeded; retry after {retry_after_s}s")
+        self.retry_after_s = retry_after_s
+
+
+class AuthenticationFailed(Exception):
+    """ Raised when Bluesky refused an account's credentials """
+
+    def __init__(self, user_name: Optional[str]):
+        super().__init__(f"Authentication of {user_name} failed")
+        self.user_name = user_name
+
+
+def retry_after_s(headers: Mapping[str, str]) -> Optional[float]:
+    """ Parses the seconds to wait from the Retry-After or RateLimit-Reset (an epoch timestamp) header """
+    headers = {key.lower(): value for key, value in headers.items()}
+    try:
+        if "retry-after" in headers:
+            return max(0.0, float(headers["retry-after"]))
+        if "ratelimit-reset" in headers:
+            return max(0.0, float(headers["ratelimit-reset"]) - time.time())
+    except ValueError:
+        pass
+    return None
+
+
+class TokenBucket:
+
+    def __init__(self, capacity: int, rate_per_s: float):
+        self.capacity = capacity
+        self.rate_per_s = rate_per_s
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+
+    def tokens(self) -> float:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_s)
+        self._updated_at = now
+        return self._tokens
+
+    def take(self):
+        self.tokens()
+        self._tokens -= 1
+
+    def seconds_until_available(self) -> float:
+        return max(0.0, (1 - self.tokens()) / self.rate_per_s)
+
+
+class PooledAccount:
+
+    def __init__(self, credentials: BlueSkyCredentials, budgets: dict[Operation, tuple[int, float]]):
+        self.credentials = credentials
+        self.buckets = {operation: TokenBucket(*budget) for operation, budget in budgets.items()}
+        self.cooldown_until = 0.0
+        self.consecutive_rate_limits = 0
+
+    def is_cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def has_budget(self, operations: tuple[Operation, ...]) -> bool:
+        return all(self.buckets[operation].tokens() >= 1 for operation in operations)
+
+
+class CredentialPool:
+    """ Spreads requests across all configured observer accounts.
+
+    Every account has a token bucket per operation, so that no account exceeds its share of the rate limits. An
+    account that got rate limited anyway is put on cooldown for as long as the response asked for or, if it didn't
+    say, for default_cooldown_s doubled with every consecutive rate limit (capped at max_cooldown_s). """
+
+    def __init__(
+            self,
+            credentials: List[BlueSkyCredentials],
+            budgets: dict[Operation, tuple[int, float]] = DEFAULT_BUDGETS,
+            default_cooldown_s: float = 5 * 60,
+            max_cooldown_s: float = 24 * 60 * 60
+    ):
+        self._accounts = [
+            PooledAccount(account, budgets) for account in credentials if account.user_name and account.password
+        ]
+        self._default_cooldown_s = default_cooldown_s
+        self._max_cooldown_s = max_cooldown_s
+
+    @staticmethod
+    def from_environment() -> 'CredentialPool':
+        """ Reads OBSERVER_LOGIN/OBSERVER_PASSWORD, the _ALTERNATIVE pair and any numbered pairs (_2, _3, ...) """
+        suffixes = ["", "_ALTERNATIVE"]
+        number = 2
+        while os.environ.get(f"OBSERVER_LOGIN_{number}"):
+            suffixes.append(f"_{number}")
+            number += 1
+        return CredentialPool([
+            BlueSkyCredentials(
+                user_name=os.environ.get(f"OBSERVER_LOGIN{suffix}"),
+                password=os.environ.get(f"OBSERVER_PASSWORD{suffix}")
+            ) for suffix in suffixes
+        ])
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def _account(self, credentials: BlueSkyCredentials) -> Optional[PooledAccount]:
+        return next((account for account in self._accounts if account.credentials is credentials), None)
+
+    def acquire(self, *operations: Operation) -> Optional[BlueSkyCredentials]:
+        """ Returns the healthy account with the most budget left for all given operations and spends it, or None if
+        every account is cooling down or out of budget """
+        return self._acquire(operations)
+
+    def _acquire(
+            self,
+            operations: tuple[Operation, ...],
+            excluded: frozenset[int] = frozenset()
+    ) -> Optional[BlueSkyCredentials]:
+        candidates = [
+            account for account in self._accounts
+            if id(account.credentials) not in excluded and not account.is_cooling_down()
+            and account.has_budget(operations)
+        ]
+        if not candidates:
+            return None
+        account = max(
+            candidates,
+            key=lambda candidate: min(candidate.buckets[operation].tokens() for operation in operations)
+        )
+        for operation in operations:
+            account.buckets[operation].take()
+        return account.credentials
+
+    async def spend(self, credentials: BlueSkyCredentials, operation: Operation):
+        """ Spends the given account's budget for operation, waiting for it to refill if necessary """
+        account = self._account(credentials)
+        if account is None:
+            return
+        bucket = account.buckets[operation]
+        delay = bucket.seconds_until_available()
+        if delay > 0:
+            logging.info(f"Budget of {credentials.user_name} for {operation.value} exhausted; waiting {delay:.1f}s")
+            await asyncio.sleep(delay)
+        bucket.take()
+
+    def report_rate_limited(self, credentials: BlueSkyCredentials, retry_after: Optional[float] = None):
+        account = self._account(credentials)
+        if account is None:
+            return
+        account.consecutive_rate_limits += 1
+        if retry_after is None:
+            retry_after = self._default_cooldown_s * 2 ** (account.consecutive_rate_limits - 1)
+        retry_after = min(retry_after, self._max_cooldown_s)
+        account.cooldown_until = time.monotonic() + retry_after
+        logging.warning(f"Rate limit exceeded for {credentials.user_name}; cooling down for {retry_after:.0f}s")
+
+    def report_success(self, credentials: BlueSkyCredentials):
+        account = self._account(credentials)
+        if account is not None:
+            account.consecutive_rate_limits = 0
+
+    async def run(
+            self,
+            call: Callable[[BlueSkyCredentials], Awaitable[Optional[T]]],
+            *operations: Operation
+    ) -> Optional[T]:
+        """ Calls call with an account and returns its result, which may be None. Only if the account got rate
+        limited (and is put on cooldown) or its credentials were refused, the next account is tried. Returns None if
+        no account could serve the call. """
+        tried: set[int] = set()
+        while True:
+            credentials = self._acquire(operations, frozenset(tried))
+            if credentials is None:
+                return None
+            tried.add(id(credentials))
+            try:
+                result = await call(credentials)
+            except RateLimitExceeded as e:
+                self.report_rate_limited(credentials, e.retry_after_s)
+                continue
+            except AuthenticationFailed as e:
+                logging.warning(f"{e}; trying the next account")
+                continue
+            self.report_success(credentials)
+            return result
+
+
+_credential_pool: Optional[CredentialPool] = None
+
+
+def credential_pool() -> CredentialPool:
+    """ The observer accounts shared by all parts of this process """
+    global _credential_pool
+    if _credential_pool is None:
+        _credential_pool = CredentialPool.from_environment()
+    return _credential_pool
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import random
+import string
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple, BinaryIO
+
+from atproto_firehose import AsyncFirehoseSubscribeReposClient
+from atproto_firehose.models import Frame, MessageFrame
+
+# Every firehose log starts with this magic, followed by records of
+# (seconds since recording start: float64, frame length: uint32, raw frame bytes)
+LOG_MAGIC = b"CBPFH\x01"
+_RECORD_HEADER = struct.Struct(">dI")
+
+
+class FirehoseRecorder:
+    """ Appends raw firehose frames to a compact on-disk log which can be replayed by replay_firehose """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames_written = 0
+        self._file: Optional[BinaryIO] = None
+        self._started_at: Optional[float] = None
+
+    def open(self):
+        self._file = open(self.path, "wb")
+        self._file.write(LOG_MAGIC)
+        self._started_at = time.monotonic()
+
+    def write(self, data: bytes):
+        if self._file is None:
+            self.open()
+        self._file.write(_RECORD_HEADER.pack(time.monotonic() - self._started_at, len(data)))
+        self._file.write(data)
+        self.frames_written += 1
+
+    def close(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+
+class _RecordingConnection:
+    """ Wraps a websocket connection so that every received binary frame is written to a FirehoseRecorder """
+
+    def __init__(self, connect, recorder: FirehoseRecorder):
+        self._connect = connect
+        self._recorder = recorder
+        self._connection = None
+
+    async def __aenter__(self):
+        self._connection = await self._connect.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._connect.__aexit__(*exc_info)
+
+    async def recv(self):
+        raw_frame = await self._connection.recv()
+        if isinstance(raw_frame, bytes):
+            self._recorder.write(raw_frame)
+        return raw_frame
+
+
+class RecordingFirehoseSubscribeReposClient(AsyncFirehoseSubscribeReposClient):
+    """ A firehose client which taps every raw frame into a FirehoseRecorder before processing it """
+
+    def __init__(self, recorder: FirehoseRecorder, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._recorder = recorder
+
+    def _get_async_client(self):
+        return _RecordingConnection(super()._get_async_client(), self._recorder)
+
+
+def read_recorded_frames(path: str) -> Iterator[Tuple[float, bytes]]:
+    """ Yields (offset in seconds, raw frame bytes) for every frame of a log written by FirehoseRecorder """
+    with open(path, "rb") as file:
+        if file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{path} is not a firehose log")
+        while True:
+            header = file.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            offset, length = _RECORD_HEADER.unpack(header)
+            yield offset, file.read(length)
+
+
+async def replay_frames(
+        frames: Iterator[Tuple[float, bytes]],
+        on_message: Callable[[MessageFrame], Awaitable[None]],
+        speed: Optional[float] = None
+) -> int:
+    """ Feeds the given raw frames into on_message (e.g. BskyPostObserver.process_firehose_message).
+    speed=1.0 replays in real time, speed=N replays N times faster, speed=None replays as fast as possible.
+    Returns the number of replayed frames. """
+    replayed = 0
+    started_at = time.monotonic()
+    for offset, data in frames:
+        if speed:
+            delay = offset / speed - (time.monotonic() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        frame = Frame.from_bytes(data)
+        if isinstance(frame, MessageFrame):
+            await on_message(frame)
+        replayed += 1
+    return replayed
+
+
+async def replay_firehose(
+        path: str,
+        on_message: Callable[[MessageFrame], Awaitable[None]],
+        speed: Optional[float] = None
+) -> int:
+    return await replay_frames(read_recorded_frames(path), on_message, speed=speed)
+
+
+class _Cid:
+    """ Marks bytes as a CID link so that they are encoded with DAG-CBOR tag 42 """
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+
+
+def _cid_for(block: bytes) -> _Cid:
+    # CIDv1, dag-cbor codec, sha2-256 multihash
+    return _Cid(b"\x01\x71\x12\x20" + hashlib.sha256(block).digest())
+
+
+def _cbor_head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([major << 5 | value])
+    if value < 0x100:
+        return bytes([major << 5 | 24, value])
+    if value < 0x10000:
+        return bytes([major << 5 | 25]) + struct.pack(">H", value)
+    if value < 0x100000000:
+        return bytes([major << 5 | 26]) + struct.pack(">I", value)
+    return bytes([major << 5 | 27]) + struct.pack(">Q", value)
+
+
+def _dag_cbor(value) -> bytes:
+    """ A minimal DAG-CBOR encoder, covering exactly what firehose frames consist of """
+    if value is None:
+        return b"\xf6"
+    if value is True:
+        return b"\xf5"
+    if value is False:
+        return b"\xf4"
+    if isinstance(value, int):
+        return _cbor_head(0, value) if value >= 0 else _cbor_head(1, -1 - value)
+    if isinstance(value, str):
+        encoded = value.encode("utf-8")
+        return _cbor_head(3, len(encoded)) + encoded
+    if isinstance(value, bytes):
+        return _cbor_head(2, len(value)) + value
+    if isinstance(value, _Cid):
+        return b"\xd8\x2a" + _dag_cbor(b"\x00" + value.raw)
+    if isinstance(value, list):
+        return _cbor_head(4, len(value)) + b"".join(_dag_cbor(item) for item in value)
+    if isinstance(value, dict):
+        # DAG-CBOR requires map keys to be sorted by length first, then bytewise
+        keys = sorted(value.keys(), key=lambda key: (len(key.encode("utf-8")), key.encode("utf-8")))
+        return _cbor_head(5, len(keys)) + b"".join(_dag_cbor(key) + _dag_cbor(value[key]) for key in keys)
+    raise TypeError(f"Cannot encode {type(value)} as DAG-CBOR")
+
+
+def _varint(value: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            encoded.append(byte | 0x80)
+        else:
+            encoded.append(byte)
+            return bytes(encoded)
+
+
+def _car(blocks: List[Tuple[_Cid, bytes]]) -> bytes:
+    header = _dag_cbor({"version": 1, "roots": [blocks[0][0]]})
+    car = bytearray(_varint(len(header)) + header)
+    for cid, block in blocks:
+        car += _varint(len(cid.raw) + len(block)) + cid.raw + block
+    return bytes(car)
+
+
+class SyntheticFrameGenerator:
+    """ Generates raw firehose frames for a given mix of commits and record collections.
+
+    collection_weights maps record collections (e.g. app.bsky.feed.post) to their relative frequency among create ops,
+    identity_ratio specifies the share of #identity frames among all generated frames. """
+
+    DEFAULT_COLLECTION_WEIGHTS = {
+        "app.bsky.feed.like": 0.55,
+        "app.bsky.feed.post": 0.15,
+        "app.bsky.feed.repost": 0.12,
+        "app.bsky.graph.follow": 0.13,
+        "blue.place.pixel": 0.05,
+    }
+
+    def __init__(
+            self,
+            collection_weights: Optional[dict[str, float]] = None,
+            ops_per_commit: Tuple[int, int] = (1, 3),
+            identity_ratio: float = 0.01,
+            repo_count: int = 1000,
+            seed: int = 0
+    ):
+        self._random = random.Random(seed)
+        weights = collection_weights or self.DEFAULT_COLLECTION_WEIGHTS
+        self._collections = list(weights.keys())
+        self._weights = list(weights.values())
+        self._ops_per_commit = ops_per_commit
+        self._identity_ratio = identity_ratio
+        self.repos = [self._did() for _ in range(repo_count)]
+        self._seq = 0
+
+    def _did(self) -> str:
+        return "did:plc:" + "".join(self._random.choices(string.ascii_lowercase + "234567", k=24))
+
+    def _rkey(self) -> str:
+        return "".join(self._random.choices(string.ascii_lowercase + "234567", k=13))
+
+    def _record(self, collection: str, created_at: str) -> dict:
+        if collection == "app.bsky.feed.post":
+            words = self._random.choices(["bluesky", "telegram", "post", "hello", "world", "news", "today"], k=12)
+            return {"$type": collection, "text": " ".join(words), "createdAt": created_at, "langs": ["en"]}
+        if collection == "app.bsky.graph.follow":
+            return {"$type": collection, "subject": self._random.choice(self.repos), "createdAt": created_at}
+        if collection == "blue.place.pixel":
+            return {"$type": collection, "x": self._random.randrange(1000), "y": self._random.randrange(1000)}
+        subject_uri = f"at://{self._random.choice(self.repos)}/app.bsky.feed.post/{self._rkey()}"
+        return {
+            "$type": collection,
+            "subject": {"uri": subject_uri, "cid": "bafyreie5737gdxlw5i64vzichcalba3z2v5n6icifvx5xytvske7mr3hpm"},
+            "createdAt": created_at
+        }
+
+    def _header(self, message_type: str) -> bytes:
+        return _dag_cbor({"op": 1, "t": message_type})
+
+    def commit_frame(self, collections: Optional[List[str]] = None) -> bytes:
+        self._seq += 1
+        now = datetime.now(timezone.utc).isoformat()
+        repo = self._random.choice(self.repos)
+        if collections is None:
+            collections = self._random.choices(
+                self._collections, weights=self._weights, k=self._random.randint(*self._ops_per_commit)
+            )
+        commit_block = _dag_cbor({"did": repo, "version": 3, "rev": self._rkey()})
+        commit_cid = _cid_for(commit_block)
+        blocks = [(commit_cid, commit_block)]
+        ops = []
+        for collection in collections:
+            block = _dag_cbor(self._record(collection, now))
+            cid = _cid_for(block)
+            blocks.append((cid, block))
+            ops.append({"action": "create", "path": f"{collection}/{self._rkey()}", "cid": cid})
+        body = {
+            "seq": self._seq,
+            "rebase": False,
+            "tooBig": False,
+            "repo": repo,
+            "commit": commit_cid,
+            "prev": None,
+            "rev": self._rkey(),
+            "since": None,
+            "blocks": _car(blocks),
+            "ops": ops,
+            "blobs": [],
+            "time": now,
+        }
+        return self._header("#commit") + _dag_cbor(body)
+
+    def identity_frame(self) -> bytes:
+        self._seq += 1
+        repo = self._random.choice(self.repos)
+        body = {
+            "seq": self._seq,
+            "did": repo,
+            "time": datetime.now(timezone.utc).isoformat(),
+            "handle": f"{self._rkey()}.bsky.social",
+        }
+        return self._header("#identity") + _dag_cbor(body)
+
+    def frames(self, count: int, frames_per_second: Optional[float] = None) -> Iterator[Tuple[float, bytes]]:
+        """ Yields count (offset in seconds, raw frame bytes) tuples, suitable for replay_frames """
+        for index in range(count):
+            offset = index / frames_per_second if frames_per_second else 0.0
+            if self._random.random() < self._identity_ratio:
+                yield offset, self.identity_frame()
+            else:
+                yield offset, self.commit_frame()
+
+    def write_log(self, path: str, count: int, frames_per_second: Optional[float] = None):
+        with open(path, "wb") as file:
+            file.write(LOG_MAGIC)
+            for offset, data in self.frames(count, frames_per_second=frames_per_second):
+                file.write(_RECORD_HEADER.pack(offset, len(data)))
+                file.write(data)
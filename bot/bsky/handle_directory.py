@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Iterable
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from bsky.bsky_api_extensions import fetch_handle
+from event_loop import event_loop
+from model.known_handle import KnownHandle
+from model.subscription import Subscription
+
+
+class HandleDirectory:
+    """ Serves the handles of subscribed DIDs from memory.
+
+    The handles are persisted in the known_handle table, seeded once via describeRepo and kept current from the
+    firehose's #identity/#handle events afterwards, so that captions and listings don't wait on an XRPC round trip.
+
+    The subscription bot and the distribution may run in separate processes sharing the table, so handles are read
+    from it again once they're older than refresh_after_s, and which DIDs are tracked is re-read from the subscription
+    table just as often. Only handles of subscribed DIDs are written to the table. """
+
+    def __init__(self, async_session: sessionmaker, resolve_concurrency: int = 8, refresh_after_s: float = 10 * 60):
+        self._async_session = async_session
+        self._handles: dict[str, str] = {}
+        # when each handle in _handles was last read from or written to the known_handle table
+        self._read_at: dict[str, float] = {}
+        self._tracked: set[str] = set()
+        self._tracked_at = 0.0
+        self._tracking_refresh: Optional[asyncio.Task] = None
+        self._resolve_concurrency = resolve_concurrency
+        self._refresh_after_s = refresh_after_s
+
+    async def load(self):
+        """ Loads the persisted handles of all subscribed DIDs and resolves the ones not known yet """
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            subscribed = set((await sql_session.scalars(select(Subscription.did).distinct())).all())
+            known = {
+                known_handle.did: known_handle.handle
+                for known_handle in (await sql_session.scalars(select(KnownHandle))).all()
+            }
+        self._set_tracked(subscribed)
+        now = time.monotonic()
+        self._handles = {did: handle for did, handle in known.items() if did in subscribed}
+        self._read_at = {did: now for did in self._handles}
+        missing = subscribed - self._handles.keys()
+        if missing:
+            logging.info(f"Resolving handles of {len(missing)} subscribed DIDs")
+            semaphore = asyncio.Semaphore(self._resolve_concurrency)
+
+            async def resolve(did: str) -> tuple[str, Optional[str]]:
+                async with semaphore:
+                    return did, await fetch_handle(did)
+
+            resolved = await asyncio.gather(*[resolve(did) for did in missing])
+            await self._store({did: handle for did, handle in resolved if handle is not None})
+        await self.prune()
+
+    def cached(self, did: str) -> Optional[str]:
+        return self._handles.get(did)
+
+    def _is_fresh(self, did: str) -> bool:
+        return time.monotonic() - self._read_at.get(did, 0.0) < self._refresh_after_s
+
+    async def handle_for(self, did: str) -> Optional[str]:
+        handle = self._handles.get(did)
+        if handle is not None and self._is_fresh(did):
+            return handle
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            known_handle = await sql_session.get(KnownHandle, did)
+        if known_handle is not None:
+            self._handles[did] = known_handle.handle
+            self._read_at[did] = time.monotonic()
+            return known_handle.handle
+        if handle is not None:
+            # pruned by another process; still good enough for this caption
+            return handle
+        handle = await fetch_handle(did)
+        if handle is not None:
+            await self._store({did: handle})
+        return handle
+
+    async def handles_for(self, dids: Iterable[str]) -> dict[str, Optional[str]]:
+        return {did: await self.handle_for(did) for did in dids}
+
+    async def remember(self, did: str, handle: str):
+        await self.remember_all({did: handle})
+
+    async def remember_all(self, handles: dict[str, str]):
+        self._tracked.update(handles.keys())
+        await self._store({did: handle for did, handle in handles.items() if self._handles.get(did) != handle})
+
+    async def prune(self):
+        """ Forgets the handles of DIDs nobody is subscribed to anymore """
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            await sql_session.execute(
+                delete(KnownHandle).where(KnownHandle.did.not_in(select(Subscription.did)))
+            )
+            await sql_session.commit()
+            subscribed = set((await sql_session.scalars(select(Subscription.did).distinct())).all())
+        self._set_tracked(subscribed)
+        for did in [did for did in self._handles if did not in subscribed]:
+            del self._handles[did]
+            self._read_at.pop(did, None)
+
+    def _set_tracked(self, subscribed: set[str]):
+        self._tracked = subscribed
+        self._tracked_at = time.monotonic()
+
+    async def _refresh_tracked(self):
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            self._set_tracked(set((await sql_session.scalars(select(Subscription.did).distinct())).all()))
+
+    def on_identity(self, did: str, handle: Optional[str]):
+        """ Consumes an identity event of the firehose. Events of DIDs that aren't subscribed to are dropped right
+        away, events without a handle cause the DID to be resolved again. """
+        if time.monotonic() - self._tracked_at >= self._refresh_after_s \
+                and (self._tracking_refresh is None or self._tracking_refresh.done()):
+            self._tracking_refresh = event_loop.create_task(self._refresh_tracked())
+        if did not in self._tracked or (handle is not None and self._handles.get(did) == handle):
+            return
+        event_loop.create_task(self._update(did, handle))
+
+    async def _update(self, did: str, handle: Optional[str]):
+        if handle is None:
+            handle = await fetch_handle(did)
+            if handle is None:
+                return
+        logging.info(f"Handle of {did} changed to {handle}")
+        await self.remember(did, handle)
+
+    async def _store(self, handles: dict[str, str]):
+        """ Caches the given handles and persists the ones of DIDs that are still subscribed to, so that a handle
+        resolved while another process unsubscribes doesn't bring back the row it pruned """
+        if not handles:
+            return
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            subscribed = set((await sql_session.scalars(
+                select(Subscription.did).where(Subscription.did.in_(handles.keys())).distinct()
+            )).all())
+            for did, handle in handles.items():
+                if did in subscribed:
+                    await sql_session.merge(KnownHandle(did=did, handle=handle))
+            await sql_session.commit()
+        now = time.monotonic()
+        self._handles.update(handles)
+        self._read_at.update({did: now for did in handles})
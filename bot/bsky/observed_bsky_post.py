@@ -1,10 +1,42 @@
+import sys
+import time
+from typing import Optional
+
+POST_COLLECTION = "app.bsky.feed.post"
+
+
 class ObservedBlueSkyPost:
+    """ A post seen on the firehose. Only the repo (the author's DID), the record key and the text are stored;
+    URIs and URLs are derived on access since most observed posts are never distributed. observed_at is the
+    time.monotonic() at which the post was seen. """
+
+    __slots__ = ("commit_repo", "content_identifier", "text", "reply_parent_uri", "created_at", "observed_at")
 
-    def __init__(self, commit_repo: str, text: str, atproto_uri: str, http_url_to_post: str, profile_url: str,
-                 content_identifier: str):
-        self.commit_repo = commit_repo
+    def __init__(
+            self,
+            commit_repo: str,
+            content_identifier: str,
+            text: str,
+            reply_parent_uri: Optional[str] = None,
+            created_at: Optional[str] = None,
+            observed_at: Optional[float] = None
+    ):
+        # the same few DIDs post over and over again, so share a single string instance per DID
+        self.commit_repo = sys.intern(commit_repo)
+        self.content_identifier = content_identifier
         self.text = text
-        self.atproto_uri = atproto_uri
-        self.http_url_to_post = http_url_to_post
-        self.profile_url = profile_url
-        self.content_identifier = content_identifier
\ No newline at end of file
+        self.reply_parent_uri = reply_parent_uri
+        self.created_at = created_at
+        self.observed_at = time.monotonic() if observed_at is None else observed_at
+
+    @property
+    def atproto_uri(self) -> str:
+        return f"at://{self.commit_repo}/{POST_COLLECTION}/{self.content_identifier}"
+
+    @property
+    def profile_url(self) -> str:
+        return f"https://bsky.app/profile/{self.commit_repo}"
+
+    @property
+    def http_url_to_post(self) -> str:
+        return f"https://bsky.app/profile/{self.commit_repo}/post/{self.content_identifier}"
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, List, Iterable
+
+from bsky.bluesky_credentials import BlueSkyCredentials
+from bsky.bsky_api_extensions import client_session, fetch_bearer_token, raise_for_rate_limit
+from bsky.credential_pool import CredentialPool, Operation, RateLimitExceeded, AuthenticationFailed
+
+GET_POSTS_LIMIT = 25
+IMAGES_EMBED_VIEW = "app.bsky.embed.images#view"
+RECORD_EMBED_VIEW = "app.bsky.embed.record#view"
+RECORD_WITH_MEDIA_EMBED_VIEW = "app.bsky.embed.recordWithMedia#view"
+
+
+class QuotedPost:
+    __slots__ = ("uri", "author_handle", "text")
+
+    def __init__(self, uri: str, author_handle: Optional[str], text: str):
+        self.uri = uri
+        self.author_handle = author_handle
+        self.text = text
+
+
+class HydratedPost:
+    """ What the AppView knows about a post beyond its record's text """
+
+    __slots__ = ("uri", "author_handle", "text", "reply_parent_uri", "quoted", "image_alts")
+
+    def __init__(
+            self,
+            uri: str,
+            author_handle: Optional[str],
+            text: str,
+            reply_parent_uri: Optional[str] = None,
+            quoted: Optional[QuotedPost] = None,
+            image_alts: Optional[List[str]] = None
+    ):
+        self.uri = uri
+        self.author_handle = author_handle
+        self.text = text
+        self.reply_parent_uri = reply_parent_uri
+        self.quoted = quoted
+        self.image_alts = image_alts or []
+
+    @staticmethod
+    def from_post_view(view: dict) -> 'HydratedPost':
+        record = view.get("record") or {}
+        embed = view.get("embed") or {}
+        media = embed.get("media") if embed.get("$type") == RECORD_WITH_MEDIA_EMBED_VIEW else embed
+        embedded_record = embed.get("record")
+        if embed.get("$type") == RECORD_WITH_MEDIA_EMBED_VIEW and embedded_record is not None:
+            embedded_record = embedded_record.get("record")
+        quoted = None
+        if embed.get("$type") in (RECORD_EMBED_VIEW, RECORD_WITH_MEDIA_EMBED_VIEW) and embedded_record is not None \
+                and isinstance(embedded_record.get("value"), dict):
+            quoted = QuotedPost(
+                uri=embedded_record.get("uri"),
+                author_handle=(embedded_record.get("author") or {}).get("handle"),
+                text=embedded_record["value"].get("text", "")
+            )
+        image_alts = []
+        if media and media.get("$type") == IMAGES_EMBED_VIEW:
+            image_alts = [image["alt"] for image in media.get("images", []) if image.get("alt")]
+        return HydratedPost(
+            uri=view["uri"],
+            author_handle=(view.get("author") or {}).get("handle"),
+            text=record.get("text", ""),
+            reply_parent_uri=((record.get("reply") or {}).get("parent") or {}).get("uri"),
+            quoted=quoted,
+            image_alts=image_alts
+        )
+
+
+class PostHydrator:
+    """ Fetches the posts of a batch, together with the posts they reply to, via app.bsky.feed.getPosts, 25 at a
+    time, over a session of an observer account that's kept until its token expires.
+
+    Recently hydrated posts are kept in an LRU of cache_size posts, so replies to the same post and posts delivered
+    to many chats are only fetched once. Hydration is best effort: posts that couldn't be fetched are just missing
+    from the result. """
+
+    def __init__(
+            self,
+            credential_pool: CredentialPool,
+            xrpc: str = "https://bsky.social/xrpc",
+            cache_size: int = 2048,
+            token_ttl_s: float = 60 * 60
+    ):
+        self.xrpc = xrpc.rstrip("/")
+        self.calls = 0
+        self.cache_hits = 0
+        self._credential_pool = credential_pool
+        self._cache: OrderedDict[str, HydratedPost] = OrderedDict()
+        self._cache_size = cache_size
+        self._token_ttl_s = token_ttl_s
+        self._credentials: Optional[BlueSkyCredentials] = None
+        self._token: Optional[str] = None
+        self._token_obtained_at = 0.0
+        self._login_lock = asyncio.Lock()
+        self._unauthenticated = False
+
+    @staticmethod
+    def from_environment(credential_pool: CredentialPool) -> 'PostHydrator':
+        return PostHydrator(
+            credential_pool,
+            xrpc=os.environ.get("POST_HYDRATION_XRPC", "https://bsky.social/xrpc")
+        )
+
+    def cached(self, uri: str) -> Optional[HydratedPost]:
+        post = self._cache.get(uri)
+        if post is not None:
+            self._cache.move_to_end(uri)
+        return post
+
+    def _remember(self, post: HydratedPost):
+        self._cache[post.uri] = post
+        self._cache.move_to_end(post.uri)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    async def hydrate(self, uris: Iterable[str], reply_parent_uris: Iterable[str] = ()) -> dict[str, HydratedPost]:
+        """ Returns the hydrated posts of uris and of reply_parent_uris by URI. Parents not given upfront are fetched
+        in a second round. """
+        wanted = list(dict.fromkeys([*uris, *reply_parent_uris]))
+        hydrated = await self._hydrate(wanted)
+        missing_parents = [
+            post.reply_parent_uri for post in list(hydrated.values())
+            if post.reply_parent_uri is not None and post.reply_parent_uri not in hydrated
+        ]
+        if missing_parents:
+            hydrated.update(await self._hydrate(list(dict.fromkeys(missing_parents))))
+        return hydrated
+
+    async def _hydrate(self, uris: List[str]) -> dict[str, HydratedPost]:
+        hydrated = {}
+        missing = []
+        for uri in uris:
+            post = self.cached(uri)
+            if post is not None:
+                self.cache_hits += 1
+                hydrated[uri] = post
+            else:
+                missing.append(uri)
+        chunks = [missing[offset:offset + GET_POSTS_LIMIT] for offset in range(0, len(missing), GET_POSTS_LIMIT)]
+        for views in await asyncio.gather(*[self._get_posts(chunk) for chunk in chunks]):
+            for view in views:
+                try:
+                    post = HydratedPost.from_post_view(view)
+                except (KeyError, TypeError, AttributeError) as e:
+                    logging.warning(f"Skipping malformed post view: {e}")
+                    continue
+                self._remember(post)
+                hydrated[post.uri] = post
+        return hydrated
+
+    async def _authorization(self) -> Optional[str]:
+        async with self._login_lock:
+            if self._token is not None and time.monotonic() - self._token_obtained_at < self._token_ttl_s:
+                return self._token
+            self._token = None
+            credentials = self._credential_pool.acquire(Operation.LOGIN)
+            if credentials is None:
+                return None
+            try:
+                self._token = await fetch_bearer_token(credentials, xrpc=self.xrpc)
+            except RateLimitExceeded as e:
+                self._credential_pool.report_rate_limited(credentials, e.retry_after_s)
+                return None
+            except AuthenticationFailed as e:
+                logging.warning(str(e))
+                return None
+            self._credentials = credentials
+            self._token_obtained_at = time.monotonic()
+            return self._token
+
+    async def _get_posts(self, uris: List[str], retry: bool = True) -> List[dict]:
+        authorization = await self._authorization()
+        if authorization is None and not self._unauthenticated:
+            logging.warning(f"No observer account could sign in to {self.xrpc}; hydrating posts unauthenticated")
+        elif authorization is not None and self._unauthenticated:
+            logging.info(f"Hydrating posts signed in to {self.xrpc} again")
+        self._unauthenticated = authorization is None
+        headers = {"Authorization": f"Bearer {authorization}"} if authorization is not None else {}
+        if self._credentials is not None and authorization is not None:
+            await self._credential_pool.spend(self._credentials, Operation.GET_POST)
+        self.calls += 1
+        try:
+            session = client_session()
+            async with session.get(
+                    f"{self.xrpc}/app.bsky.feed.getPosts",
+                    params=[("uris", uri) for uri in uris],
+                    headers=headers
+            ) as response:
+                raise_for_rate_limit(response.status, response.headers)
+                if response.status in (400, 401) and authorization is not None and retry:
+                    # most likely an expired token
+                    self._token = None
+                    return await self._get_posts(uris, retry=False)
+                response.raise_for_status()
+                return (await response.json()).get("posts", [])
+        except RateLimitExceeded as e:
+            if self._credentials is not None:
+                self._credential_pool.report_rate_limited(self._credentials, e.retry_after_s)
+                self._token = None
+            return []
+        except Exception as e:
+            logging.warning(f"Hydrating {len(uris)} posts failed: {e}")
+            return []
@@ -0,0 +1,36 @@
+from typing import Optional
+
+from bsky.observed_bsky_post import POST_COLLECTION
+
+
+class DecodedPostRecord:
+    """ The few fields of an app.bsky.feed.post record the bot actually uses """
+
+    __slots__ = ("text", "reply_parent_uri", "created_at")
+
+    def __init__(self, text: str, reply_parent_uri: Optional[str], created_at: Optional[str]):
+        self.text = text
+        self.reply_parent_uri = reply_parent_uri
+        self.created_at = created_at
+
+
+def collection_of(path: str) -> str:
+    """ Returns the collection of a repo op path, such as app.bsky.feed.post for app.bsky.feed.post/3kabc """
+    return path.partition("/")[0]
+
+
+def decode_post_record(raw: Optional[dict]) -> Optional[DecodedPostRecord]:
+    """ Reads text, reply parent and creation date straight from a DAG-CBOR decoded record block,
+    without validating it into an atproto model. Returns None if the block isn't a post record. """
+    if not isinstance(raw, dict) or raw.get("$type") != POST_COLLECTION:
+        return None
+    text = raw.get("text")
+    if not isinstance(text, str):
+        return None
+    reply_parent_uri = None
+    reply = raw.get("reply")
+    if isinstance(reply, dict):
+        parent = reply.get("parent")
+        if isinstance(parent, dict):
+            reply_parent_uri = parent.get("uri")
+    return DecodedPostRecord(text=text, reply_parent_uri=reply_parent_uri, created_at=raw.get("createdAt"))
@@ -0,0 +1,47 @@
+import asyncio
+import os
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+import distribution_main
+import subscription_management_main
+from bsky.bsky_api_extensions import close_client_session
+from bsky.handle_directory import HandleDirectory
+from event_loop import event_loop
+from run_migrations import run_migrations_async
+from subscriber_index import SubscriberIndex
+
+engine: Optional[AsyncEngine] = None
+
+
+async def __run_combined_async__(session_maker: sessionmaker):
+    # both sides share a single handle directory, subscriber index, HTTP connection pool & Telegram bot
+    directory = HandleDirectory(session_maker)
+    index = SubscriberIndex()
+    await directory.load()
+    await index.load(session_maker)
+    subscription_management_main.setup_subscription_management(session_maker, directory, index)
+    tg_application = subscription_management_main.build_application()
+    distribution_main.setup_distribution(session_maker, directory, index, bot=tg_application.bot)
+    try:
+        await asyncio.gather(
+            subscription_management_main.receive_updates(tg_application),
+            distribution_main.__distribute_posts_async__()
+        )
+    finally:
+        await close_client_session()
+
+
+def run_combined():
+    """ Runs the subscription bot and the distribution in a single process on the same event loop """
+    asyncio.set_event_loop(loop=event_loop)
+    current_dir_path = os.path.dirname(os.path.realpath(__file__))
+    event_loop.run_until_complete(
+        run_migrations_async(f"{current_dir_path}/alembic", os.environ.get("SQLALCHEMY_URL"))
+    )
+    global engine
+    engine = create_async_engine(os.environ.get("SQLALCHEMY_URL"))
+    session_maker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    event_loop.run_until_complete(__run_combined_async__(session_maker))
@@ -0,0 +1,186 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, false_positive_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = capacity
+        self.bit_count = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.bit_count + 7) // 8)
+        self.count = count
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = struct.unpack("<QQ", digest)
+        # Kirsch-Mitzenmacher: derive all hash functions from two independent ones
+        for index in range(self.hash_count):
+            yield (first + index * second) % self.bit_count
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def is_full(self) -> bool:
+        return self.count >= self.capacity
+
+
+class DeliveryDeduplicator:
+    """ Remembers which post has been delivered to which chat, so that posts replayed by a firehose reconnect or
+    contained in overlapping batches aren't rendered and sent twice.
+
+    A delivery is claimed before it's made and only marked as delivered once it's been sent, so a failed send is
+    retried when the post shows up again. Deliveries of the last window_s seconds are kept exactly in an LRU of at
+    most max_recent entries; only the ones that leave it are added to two generations of Bloom filters, which are
+    snapshotted, together with the exact ones, to snapshot_path if given. """
+
+    _SNAPSHOT_HEADER = struct.Struct(">IdII")
+
+    def __init__(
+            self,
+            window_s: float = 6 * 60 * 60,
+            max_recent: int = 100_000,
+            bloom_capacity: int = 200_000,
+            false_positive_rate: float = 1e-4,
+            snapshot_path: Optional[str] = None
+    ):
+        self.window_s = window_s
+        self.max_recent = max_recent
+        self.snapshot_path = snapshot_path
+        self.suppressed = 0
+        self._bloom_capacity = bloom_capacity
+        self._false_positive_rate = false_positive_rate
+        self._recent: OrderedDict[str, float] = OrderedDict()
+        self._claimed: set[str] = set()
+        self._current = BloomFilter(bloom_capacity, false_positive_rate)
+        self._previous = BloomFilter(bloom_capacity, false_positive_rate)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    @staticmethod
+    def _key(chat_id: int, at_uri: str) -> str:
+        return f"{chat_id} {at_uri}"
+
+    def is_delivered(self, chat_id: int, at_uri: str) -> bool:
+        key = self._key(chat_id, at_uri)
+        self._expire(time.monotonic())
+        return key in self._recent or key in self._current or key in self._previous
+
+    def claim(self, chat_id: int, at_uri: str) -> bool:
+        """ Returns False if at_uri has been or is being delivered to chat_id; otherwise claims the delivery until
+        mark_delivered or release is called """
+        key = self._key(chat_id, at_uri)
+        if key in self._claimed or self.is_delivered(chat_id, at_uri):
+            self.suppressed += 1
+            return False
+        self._claimed.add(key)
+        return True
+
+    def release(self, chat_id: int, at_uri: str):
+        """ Gives up the claim of a delivery that couldn't be made; no-op once it's been marked as delivered """
+        self._claimed.discard(self._key(chat_id, at_uri))
+
+    def mark_delivered(self, chat_id: int, at_uri: str):
+        key = self._key(chat_id, at_uri)
+        self._claimed.discard(key)
+        self._recent[key] = time.monotonic()
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.max_recent:
+            self._retire(self._recent.popitem(last=False)[0])
+        self._dirty = True
+
+    def _expire(self, now: float):
+        while self._recent:
+            key, delivered_at = next(iter(self._recent.items()))
+            if now - delivered_at < self.window_s:
+                return
+            self._recent.popitem(last=False)
+            self._retire(key)
+
+    def _retire(self, key: str):
+        """ Moves a delivery that left the exact window to the Bloom filters """
+        self._current, self._previous = self._add_to_filters(self._current, self._previous, key)
+
+    def _add_to_filters(self, current: BloomFilter, previous: BloomFilter, key: str) -> tuple[BloomFilter, BloomFilter]:
+        if current.is_full:
+            current, previous = BloomFilter(self._bloom_capacity, self._false_positive_rate), current
+        current.add(key)
+        return current, previous
+
+    def snapshot(self) -> Optional[tuple[BloomFilter, BloomFilter, list[str]]]:
+        """ Returns copies of the Bloom filters and the exactly kept deliveries if they changed since the last
+        snapshot; serializing them is left to write_snapshot, so that hashing doesn't block the caller """
+        if not self._dirty:
+            return None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        return (
+            BloomFilter(self._bloom_capacity, self._false_positive_rate, bytearray(self._current.bits),
+                        self._current.count),
+            BloomFilter(self._bloom_capacity, self._false_positive_rate, bytearray(self._previous.bits),
+                        self._previous.count),
+            list(self._recent)
+        )
+
+    def should_save(self, min_interval_s: float = 60.0) -> bool:
+        return self.snapshot_path is not None and self._dirty \
+            and time.monotonic() - self._saved_at >= min_interval_s
+
+    def write_snapshot(self, snapshot: tuple[BloomFilter, BloomFilter, list[str]]):
+        """ Writes the snapshot atomically: to a temporary file first, which then replaces the previous snapshot """
+        current, previous, recent = snapshot
+        # after a restart, the exactly kept deliveries are only covered by the Bloom filters
+        for key in recent:
+            current, previous = self._add_to_filters(current, previous, key)
+        temporary_path = f"{self.snapshot_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(self._SNAPSHOT_HEADER.pack(
+                self._bloom_capacity, self._false_positive_rate, current.count, previous.count
+            ))
+            file.write(current.bits)
+            file.write(previous.bits)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        """ Restores the Bloom filters from snapshot_path; a snapshot that can't be read is ignored """
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, "rb") as file:
+                data = file.read()
+            capacity, false_positive_rate, current_count, previous_count = self._SNAPSHOT_HEADER.unpack_from(data)
+        except (OSError, struct.error) as e:
+            logging.warning(f"Ignoring unreadable deduplication snapshot {self.snapshot_path}: {e}")
+            return
+        if capacity != self._bloom_capacity or false_positive_rate != self._false_positive_rate:
+            logging.warning(f"Ignoring deduplication snapshot {self.snapshot_path} of a different configuration")
+            return
+        size = len(self._current.bits)
+        offset = self._SNAPSHOT_HEADER.size
+        if len(data) != offset + 2 * size:
+            logging.warning(
+                f"Ignoring truncated or corrupt deduplication snapshot {self.snapshot_path} "
+                f"({len(data)} instead of {offset + 2 * size} bytes)"
+            )
+            return
+        self._current = BloomFilter(
+            capacity, false_positive_rate, bytearray(data[offset:offset + size]), current_count
+        )
+        self._previous = BloomFilter(
+            capacity, false_positive_rate, bytearray(data[offset + size:offset + 2 * size]), previous_count
+        )
+        logging.info(f"Loaded deduplication snapshot of {current_count + previous_count} deliveries")
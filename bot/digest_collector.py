@@ -0,0 +1,109 @@
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from bsky.observed_bsky_post import ObservedBlueSkyPost
+from model.pending_digest_post import PendingDigestPost
+from model.subscription import Subscription, DEFAULT_DIGEST_INTERVAL_MINUTES
+
+
+class PendingDigest:
+    __slots__ = ("posts", "row_ids", "due_at", "failed_attempts")
+
+    def __init__(self, due_at: float):
+        self.posts: List[ObservedBlueSkyPost] = []
+        # IDs of the posts' rows in the pending_digest_post table
+        self.row_ids: List[int] = []
+        self.due_at = due_at
+        self.failed_attempts = 0
+
+
+class DigestCollector:
+    """ Collects the posts of digest subscriptions per chat until the chat's digest is due.
+
+    A chat's digest is due digest_interval minutes after its first pending post arrived; if the chat has digest
+    subscriptions with different intervals, the shortest one applies. Pending posts are kept in memory and in the
+    pending_digest_post table until their digest has been sent, so that a restart doesn't lose them; digests that
+    couldn't be sent are retried. """
+
+    def __init__(self, async_session: sessionmaker, max_retry_delay_s: float = 60 * 60):
+        self.max_retry_delay_s = max_retry_delay_s
+        self._async_session = async_session
+        self._pending: dict[int, PendingDigest] = {}
+
+    def __len__(self) -> int:
+        return sum(len(digest.posts) for digest in self._pending.values())
+
+    async def load(self):
+        """ Restores the digests that were pending when the process stopped """
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            rows = (await sql_session.scalars(select(PendingDigestPost).order_by(PendingDigestPost.id))).all()
+        self._pending = {}
+        for row in rows:
+            self._collect(
+                row.chat_id,
+                ObservedBlueSkyPost(row.commit_repo, row.content_identifier, row.text),
+                row.id,
+                row.due_at
+            )
+
+    async def add_all(self, deliveries: List[Tuple[Subscription, ObservedBlueSkyPost]], now: Optional[float] = None):
+        """ Persists the given deliveries and adds them to their chats' digests """
+        now = time.time() if now is None else now
+        rows = []
+        for subscription, post in deliveries:
+            due_at = now + (subscription.digest_interval or DEFAULT_DIGEST_INTERVAL_MINUTES) * 60
+            digest = self._pending.get(subscription.chat_id)
+            rows.append(PendingDigestPost(
+                chat_id=subscription.chat_id,
+                commit_repo=post.commit_repo,
+                content_identifier=post.content_identifier,
+                text=post.text,
+                due_at=min(due_at, digest.due_at) if digest is not None else due_at
+            ))
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            sql_session.add_all(rows)
+            await sql_session.commit()
+        for row, (_, post) in zip(rows, deliveries):
+            self._collect(row.chat_id, post, row.id, row.due_at)
+
+    def _collect(self, chat_id: int, post: ObservedBlueSkyPost, row_id: int, due_at: float):
+        digest = self._pending.get(chat_id)
+        if digest is None:
+            digest = self._pending[chat_id] = PendingDigest(due_at)
+        else:
+            digest.due_at = min(digest.due_at, due_at)
+        digest.posts.append(post)
+        digest.row_ids.append(row_id)
+
+    def due(self, now: Optional[float] = None) -> List[Tuple[int, PendingDigest]]:
+        """ Removes and returns the digests that are due, as (chat ID, digest); their rows are kept until discard is
+        called """
+        now = time.time() if now is None else now
+        due_chats = [chat_id for chat_id, digest in self._pending.items() if digest.due_at <= now]
+        return [(chat_id, self._pending.pop(chat_id)) for chat_id in due_chats]
+
+    def retry(self, chat_id: int, digest: PendingDigest, now: Optional[float] = None):
+        """ Puts back a digest that couldn't be sent; it's due again after a delay that doubles with every failed
+        attempt, from one minute up to max_retry_delay_s. Posts collected for the chat meanwhile are sent along. """
+        now = time.time() if now is None else now
+        digest.failed_attempts += 1
+        digest.due_at = now + min(60 * 2 ** (digest.failed_attempts - 1), self.max_retry_delay_s)
+        collected_meanwhile = self._pending.get(chat_id)
+        if collected_meanwhile is not None:
+            digest.posts.extend(collected_meanwhile.posts)
+            digest.row_ids.extend(collected_meanwhile.row_ids)
+            digest.due_at = min(digest.due_at, collected_meanwhile.due_at)
+        self._pending[chat_id] = digest
+
+    async def discard(self, digest: PendingDigest):
+        """ Deletes the rows of a digest that has been sent """
+        sql_session: AsyncSession
+        async with self._async_session() as sql_session:
+            await sql_session.execute(delete(PendingDigestPost).where(PendingDigestPost.id.in_(digest.row_ids)))
+            await sql_session.commit()
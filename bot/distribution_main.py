@@ -1,133 +1,460 @@
 import asyncio
+import html
 import logging
 import os
-from typing import Optional
+from collections import deque
+from typing import Optional, List, Iterator, Tuple, Set, Deque
 
 import telegram
 from atproto.exceptions import FirehoseError
 from reactivex.abc import DisposableBase
-from selenium.common import WebDriverException
-from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.common import WebDriverException, NoSuchElementException
+from selenium.webdriver.common.by import By
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from telegram import Message, ReplyParameters
 from telegram.constants import ParseMode
 from telegram.error import BadRequest
 
+from async_webdriver import AsyncWebDriver
+from bsky.bluesky_credentials import BlueSkyCredentials
 from bsky.bsky_account_observer import BskyPostObserver
-from bsky.bsky_api_extensions import fetch_handle
+from bsky.bsky_api_extensions import get_profile_identifier_and_post_identifier_from_at_proto_uri
+from bsky.credential_pool import credential_pool, Operation
+from bsky.handle_directory import HandleDirectory
 from bsky.observed_bsky_post import ObservedBlueSkyPost
+from bsky.post_hydrator import PostHydrator, HydratedPost
+from delivery_deduplicator import DeliveryDeduplicator
+from digest_collector import DigestCollector
 from event_loop import event_loop, async_io_scheduler
-from model.subscription import Subscription
+from load_controller import LoadController
+from model.subscription import Subscription, DIGEST_DELIVERY
+from model.subscription_filter import SubscriptionFilter
 from run_migrations import run_migrations_async
+from screenshot_encoder import ScreenshotEncoder
 from selenium_webdriver_setup import setup_selenium
+from subscriber_index import SubscriberIndex
+from subscription_filters import SubscriptionFilters
 from telegram_extensions import link
 
 engine: Optional[AsyncEngine] = None
 async_session: Optional[sessionmaker] = None
+handle_directory: Optional[HandleDirectory] = None
+deduplicator: Optional[DeliveryDeduplicator] = None
+screenshot_encoder: Optional[ScreenshotEncoder] = None
+digest_collector: Optional[DigestCollector] = None
+subscription_filters = SubscriptionFilters()
+load_controller: Optional[LoadController] = None
+post_hydrator: Optional[PostHydrator] = None
+# (chat ID, message ID, post) of the posts delivered as text only under load whose screenshot is still to be sent
+follow_ups: Deque[Tuple[int, int, ObservedBlueSkyPost]] = deque(maxlen=1000)
+# only set if running alongside the subscription bot, which keeps it up to date
+subscriber_index: Optional[SubscriberIndex] = None
+telegram_bot: Optional[telegram.Bot] = None
 observation_subscription: Optional[DisposableBase] = None
+identity_subscription: Optional[DisposableBase] = None
+digest_task: Optional[asyncio.Task] = None
+follow_up_task: Optional[asyncio.Task] = None
+
+# the post itself, without the navigation and the thread around it
+POST_ELEMENT_XPATH = "//div[starts-with(@data-testid,'postThreadItem-by-')]"
+# Telegram's limit for the text of a message
+MAX_MESSAGE_LENGTH = 4096
+MAX_DIGEST_POST_LENGTH = 280
+# keeps captions of screenshots within Telegram's limit of 1024 characters
+MAX_CONTEXT_LENGTH = 150
+MAX_IMAGE_ALTS = 2
+# how long captions wait for hydration, counted from the start of a batch, before falling back to the plain ones
+HYDRATION_TIMEOUT_S = 5.0
+
+
+def posts_by_subscription(
+        posts: List[ObservedBlueSkyPost],
+        subscriptions: List[Subscription]
+) -> Iterator[Tuple[Subscription, ObservedBlueSkyPost]]:
+    for subscription in subscriptions:
+        for post in filter(lambda post: post.commit_repo == subscription.did, posts):
+            yield subscription, post
+
+
+async def find_subscriptions(sql_session: AsyncSession, posts: List[ObservedBlueSkyPost]) -> List[Subscription]:
+    if subscriber_index is not None:
+        return subscriber_index.subscriptions_for(post.commit_repo for post in posts)
+    return list((await sql_session.scalars(
+        select(Subscription).where(Subscription.did.in_([post.commit_repo for post in posts]))
+    )).all())
+
+
+async def update_subscription_filters(sql_session: AsyncSession, subscriptions: List[Subscription]):
+    dids = {subscription.did for subscription in subscriptions}
+    subscription_filters.update(dids, list((await sql_session.scalars(
+        select(SubscriptionFilter).where(SubscriptionFilter.did.in_(dids))
+    )).all()))
+
+
+def matching_deliveries(
+        deliveries: Iterator[Tuple[Subscription, ObservedBlueSkyPost]]
+) -> Iterator[Tuple[Subscription, ObservedBlueSkyPost]]:
+    """ Drops the deliveries to chats whose filters the post doesn't match; each post is matched only once """
+    matching_chats: dict[str, Set[int]] = {}
+    for subscription, post in deliveries:
+        if subscription.chat_id not in subscription_filters.filtered_chats(post.commit_repo):
+            yield subscription, post
+            continue
+        if post.atproto_uri not in matching_chats:
+            matching_chats[post.atproto_uri] = subscription_filters.matching_chats(post.commit_repo, post.text)
+        if subscription.chat_id in matching_chats[post.atproto_uri]:
+            yield subscription, post
 
 
 async def distribute(posts: [ObservedBlueSkyPost]):
     global async_session
     async with async_session() as sql_session:
-        subscriptions = (await sql_session.scalars(
-            select(Subscription).where(Subscription.did.in_([post.commit_repo for post in posts]))
-        )).all()
+        subscriptions = await find_subscriptions(sql_session, posts)
         logging.info(f"Processing {len(posts)} posts")
         if not subscriptions:
             logging.info("There are no subscriptions; done processing")
             return
-        logging.info(f"Setting up selenium for screenshotting ...")
-        browser = await setup_selenium()
-        bot = telegram.Bot(token=os.environ.get("TELEGRAM_API_KEY"))
+        await update_subscription_filters(sql_session, subscriptions)
+        deliveries = [
+            (subscription, post) for subscription, post in matching_deliveries(
+                posts_by_subscription(posts, subscriptions)
+            )
+            if deduplicator.claim(subscription.chat_id, post.atproto_uri)
+        ]
+        if not deliveries:
+            logging.info("All deliveries have been made already or were filtered out; done processing")
+            return
+        try:
+            deliveries = await collect_digest_deliveries(deliveries)
+        except Exception:
+            for subscription, post in deliveries:
+                deduplicator.release(subscription.chat_id, post.atproto_uri)
+            raise
+        if not deliveries:
+            logging.info("All deliveries are part of digests; done processing")
+            await save_deduplication_snapshot()
+            return
+        batch = load_controller.enqueue([post.observed_at for _, post in deliveries])
+        browser: Optional[AsyncWebDriver] = None
+        observer_credentials: Optional[BlueSkyCredentials] = None
+        browser_set_up = False
+        bot = distribution_bot()
         logging.info(f"Distributing to {len(posts)} to {len(subscriptions)}")
-        for subscription in subscriptions:
-            for post in filter(lambda post: post.commit_repo == subscription.did, posts):
+        # each post is only hydrated once, however many chats it's delivered to, and while the browser is set up
+        posts_to_caption = list({post.atproto_uri: post for _, post in deliveries}.values())
+        hydration = event_loop.create_task(post_hydrator.hydrate(
+            [post.atproto_uri for post in posts_to_caption],
+            [post.reply_parent_uri for post in posts_to_caption if post.reply_parent_uri is not None]
+        ))
+        hydration_deadline = event_loop.time() + HYDRATION_TIMEOUT_S
+        try:
+            for subscription, post in deliveries:
                 logging.info(f"Processing {post.http_url_to_post} ...")
-                user_handle = await fetch_handle(post.commit_repo)
-                if browser is not None:
-                    screenshot = await take_screenshot(post, browser)
-                    try:
-                        await bot.send_photo(
-                            chat_id=subscription.chat_id,
-                            photo=open(screenshot, 'rb'),
-                            caption=f"{link(url=post.profile_url, caption=user_handle)}:"
-                                    f"\n\n{post.text}"
-                                    f"\n\n{link(url=post.http_url_to_post, caption='Open in Browser')}",
-                            parse_mode=ParseMode.HTML
-                        )
-                    except BadRequest as e:
-                        await bot.send_photo(
-                            chat_id=subscription.chat_id,
-                            photo=open(screenshot, 'rb'),
-                            caption=f"{post.profile_url}:"
-                                    f"\n\n{post.text}"
-                                    f"\n\n{post.http_url_to_post}",
-                        )
+                user_handle = await handle_directory.handle_for(post.commit_repo)
+                if load_controller.is_degraded(batch):
+                    load_controller.degraded_deliveries += 1
+                    # sent right away, with context only if hydration is done already
+                    context = await caption_context(post, hydration, hydration_deadline, wait=False)
+                    message = await send_text(bot, subscription, post, user_handle, context)
+                    deduplicator.mark_delivered(subscription.chat_id, post.atproto_uri)
+                    if load_controller.follow_up_images:
+                        follow_ups.append((subscription.chat_id, message.message_id, post))
+                    load_controller.done(batch)
+                    continue
+                if not browser_set_up:
+                    logging.info(f"Setting up selenium for screenshotting ...")
+                    browser, observer_credentials = await setup_selenium()
+                    browser_set_up = True
+                screenshot = await take_screenshot(post, browser, observer_credentials) if browser is not None else None
+                if browser is not None and browser.broken:
+                    browser, observer_credentials = await renewed_browser(browser)
+                context = await caption_context(post, hydration, hydration_deadline)
+                if screenshot is not None:
+                    await send_screenshot(bot, subscription, post, user_handle, screenshot, context)
                 else:
-                    try:
-                        await bot.send_message(
-                            chat_id=subscription.chat_id,
-                            text=f"{link(url=post.profile_url, caption=user_handle)}:"
-                                 f"\n\n{post.text}"
-                                 f"\n\n{link(url=post.http_url_to_post, caption='Open in Browser')}",
-                            parse_mode=ParseMode.HTML
-                        )
-                    except BadRequest as e:
-                        await bot.send_message(
-                            chat_id=subscription.chat_id,
-                            text=f"{user_handle}:"
-                                 f"\n\n{post.text}"
-                                 f"\n\n{post.http_url_to_post}"
-                        )
+                    await send_text(bot, subscription, post, user_handle, context)
+                deduplicator.mark_delivered(subscription.chat_id, post.atproto_uri)
+                load_controller.done(batch)
+        finally:
+            hydration.cancel()
+            load_controller.finish(batch)
+            # deliveries that failed or weren't reached are made again if the post is replayed
+            for subscription, post in deliveries:
+                deduplicator.release(subscription.chat_id, post.atproto_uri)
+            if browser is not None:
+                await browser.quit()
+        await save_deduplication_snapshot()
+        if screenshot_encoder.encoded:
+            logging.info(
+                f"{screenshot_encoder.encoded} screenshots encoded so far; "
+                f"{screenshot_encoder.original_bytes - screenshot_encoder.encoded_bytes} bytes "
+                f"({screenshot_encoder.saved_ratio:.0%}) saved"
+            )
+
+
+def shortened(text: str, max_length: int = MAX_CONTEXT_LENGTH) -> str:
+    return text if len(text) <= max_length else f"{text[:max_length]}…"
+
+
+async def caption_context(
+        post: ObservedBlueSkyPost,
+        hydration: asyncio.Task,
+        deadline: float,
+        wait: bool = True
+) -> Tuple[str, str]:
+    """ Returns the post_context of post once hydration is done, or no context if it isn't by deadline, if it failed
+    or, unless wait is set, if it isn't done yet """
+    if not hydration.done():
+        if not wait:
+            return "", ""
+        try:
+            await asyncio.wait_for(asyncio.shield(hydration), max(0.0, deadline - event_loop.time()))
+        except asyncio.TimeoutError:
+            logging.debug(f"Hydration not done in time; sending {post.http_url_to_post} with a plain caption")
+            return "", ""
+        except Exception as e:
+            logging.warning(f"Hydration failed; sending plain captions: {e}")
+            return "", ""
+    if hydration.cancelled() or hydration.exception() is not None:
+        return "", ""
+    return post_context(post, hydration.result())
+
+
+def post_context(post: ObservedBlueSkyPost, hydrated_posts: dict[str, HydratedPost]) -> Tuple[str, str]:
+    """ Returns the HTML to put before and after a post's text in its caption: the post it replies to, and the post
+    it quotes and the alt texts of its images """
+    hydrated = hydrated_posts.get(post.atproto_uri)
+    parent_uri = post.reply_parent_uri or (hydrated.reply_parent_uri if hydrated is not None else None)
+    parent = hydrated_posts.get(parent_uri) if parent_uri is not None else None
+    before = ""
+    if parent is not None:
+        profile, rkey = get_profile_identifier_and_post_identifier_from_at_proto_uri(parent.uri)
+        parent_url = f"https://bsky.app/profile/{profile}/post/{rkey}"
+        before = f"\n\n<i>Replying to {link(url=parent_url, caption=parent.author_handle)}: " \
+                 f"{html.escape(shortened(parent.text))}</i>"
+    after = ""
+    if hydrated is not None and hydrated.quoted is not None:
+        quoted = hydrated.quoted
+        after += f"\n\n<i>Quoting {quoted.author_handle or quoted.uri}: {html.escape(shortened(quoted.text))}</i>"
+    if hydrated is not None:
+        for alt in hydrated.image_alts[:MAX_IMAGE_ALTS]:
+            after += f"\n\n<i>Image: {html.escape(shortened(alt))}</i>"
+    return before, after
+
+
+async def send_screenshot(
+        bot: telegram.Bot,
+        subscription: Subscription,
+        post: ObservedBlueSkyPost,
+        user_handle: Optional[str],
+        screenshot: str,
+        context: Tuple[str, str] = ("", "")
+) -> Message:
+    before, after = context
+    try:
+        with open(screenshot, 'rb') as photo:
+            return await bot.send_photo(
+                chat_id=subscription.chat_id,
+                photo=photo,
+                caption=f"{link(url=post.profile_url, caption=user_handle)}:"
+                        f"{before}\n\n{post.text}{after}"
+                        f"\n\n{link(url=post.http_url_to_post, caption='Open in Browser')}",
+                parse_mode=ParseMode.HTML
+            )
+    except BadRequest as e:
+        with open(screenshot, 'rb') as photo:
+            return await bot.send_photo(
+                chat_id=subscription.chat_id,
+                photo=photo,
+                caption=f"{post.profile_url}:"
+                        f"\n\n{post.text}"
+                        f"\n\n{post.http_url_to_post}",
+            )
+
+
+async def send_text(
+        bot: telegram.Bot,
+        subscription: Subscription,
+        post: ObservedBlueSkyPost,
+        user_handle: Optional[str],
+        context: Tuple[str, str] = ("", "")
+) -> Message:
+    before, after = context
+    try:
+        return await bot.send_message(
+            chat_id=subscription.chat_id,
+            text=f"{link(url=post.profile_url, caption=user_handle)}:"
+                 f"{before}\n\n{post.text}{after}"
+                 f"\n\n{link(url=post.http_url_to_post, caption='Open in Browser')}",
+            parse_mode=ParseMode.HTML
+        )
+    except BadRequest as e:
+        return await bot.send_message(
+            chat_id=subscription.chat_id,
+            text=f"{user_handle}:"
+                 f"\n\n{post.text}"
+                 f"\n\n{post.http_url_to_post}"
+        )
+
+
+async def send_follow_up_images(interval_s: float = 10.0):
+    """ Sends the screenshots of posts delivered as text only while delivery was degraded, as replies to the text
+    messages, once delivery has caught up """
+    while True:
+        await asyncio.sleep(interval_s)
+        if not follow_ups or load_controller.queue_depth or load_controller.is_degraded():
+            continue
+        browser: Optional[AsyncWebDriver] = None
+        try:
+            browser, observer_credentials = await setup_selenium()
+            if browser is None:
+                continue
+            while follow_ups and not load_controller.queue_depth:
+                chat_id, message_id, post = follow_ups.popleft()
+                screenshot = await take_screenshot(post, browser, observer_credentials)
+                if browser.broken:
+                    browser, observer_credentials = await renewed_browser(browser)
+                    if browser is None:
+                        break
+                if screenshot is None:
+                    continue
+                with open(screenshot, 'rb') as photo:
+                    await distribution_bot().send_photo(
+                        chat_id=chat_id,
+                        photo=photo,
+                        reply_parameters=ReplyParameters(message_id=message_id, allow_sending_without_reply=True)
+                    )
+        except Exception as e:
+            logging.exception("Sending follow-up images failed", exc_info=e)
+        finally:
+            if browser is not None:
+                await browser.quit()
+
+
+def distribution_bot() -> telegram.Bot:
+    return telegram_bot if telegram_bot is not None else telegram.Bot(token=os.environ.get("TELEGRAM_API_KEY"))
+
+
+async def collect_digest_deliveries(
+        deliveries: List[Tuple[Subscription, ObservedBlueSkyPost]]
+) -> List[Tuple[Subscription, ObservedBlueSkyPost]]:
+    """ Hands the deliveries of digest subscriptions to the digest collector; returns the ones to deliver now.
+    Digest deliveries count as delivered once they're persisted as pending. """
+    digest_deliveries = [
+        (subscription, post) for subscription, post in deliveries if subscription.delivery_mode == DIGEST_DELIVERY
+    ]
+    if digest_deliveries:
+        await digest_collector.add_all(digest_deliveries)
+        for subscription, post in digest_deliveries:
+            deduplicator.mark_delivered(subscription.chat_id, post.atproto_uri)
+    return [
+        (subscription, post) for subscription, post in deliveries if subscription.delivery_mode != DIGEST_DELIVERY
+    ]
+
+
+async def send_digest(chat_id: int, posts: List[ObservedBlueSkyPost]):
+    lines = []
+    for post in posts:
+        user_handle = await handle_directory.handle_for(post.commit_repo)
+        text = post.text if len(post.text) <= MAX_DIGEST_POST_LENGTH else f"{post.text[:MAX_DIGEST_POST_LENGTH]}…"
+        lines.append(
+            f"{link(url=post.profile_url, caption=user_handle)}: {html.escape(text)} "
+            f"({link(url=post.http_url_to_post, caption='Open')})"
+        )
+    messages = [f"<b>{len(posts)} new post(s)</b>"]
+    for line in lines:
+        if len(messages[-1]) + len(line) + 2 > MAX_MESSAGE_LENGTH:
+            messages.append(line)
+        else:
+            messages[-1] += f"\n\n{line}"
+    bot = distribution_bot()
+    for text in messages:
+        await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True
+        )
+
+
+async def send_digests(interval_s: float = 30.0):
+    while True:
+        await asyncio.sleep(interval_s)
+        for chat_id, digest in digest_collector.due():
+            logging.info(f"Sending digest of {len(digest.posts)} posts to chat with ID {chat_id}")
+            try:
+                await send_digest(chat_id, digest.posts)
+            except Exception as e:
+                logging.exception(f"Sending digest to chat with ID {chat_id} failed; retrying later", exc_info=e)
+                digest_collector.retry(chat_id, digest)
+                continue
+            try:
+                await digest_collector.discard(digest)
+            except Exception as e:
+                logging.exception(f"Discarding the digest of chat with ID {chat_id} failed", exc_info=e)
+
+
+async def save_deduplication_snapshot():
+    if not deduplicator.should_save():
+        return
+    logging.info(f"{deduplicator.suppressed} duplicate deliveries suppressed so far")
+    snapshot = deduplicator.snapshot()
+    await event_loop.run_in_executor(None, deduplicator.write_snapshot, snapshot)
+
+
+async def renewed_browser(browser: AsyncWebDriver) -> Tuple[Optional[AsyncWebDriver], Optional[BlueSkyCredentials]]:
+    """ Quits a browser whose session hung and sets up a new one """
+    logging.warning("Browser session stopped responding; setting up a new one")
+    await browser.quit()
+    return await setup_selenium()
 
 
 async def take_screenshot(
         post: ObservedBlueSkyPost,
-        browser: WebDriver,
+        browser: AsyncWebDriver,
+        credentials: BlueSkyCredentials,
         retry: int = 0,
         retry_limit: int = 5
 ) -> Optional[str]:
     screenshots_dir = os.environ.get("SCREENSHOT_DIRECTORY")
-    screenshot_path = f"{screenshots_dir}/{post.commit_repo.replace(':', '-')}_{post.content_identifier}.png"
+    screenshot_path = f"{screenshots_dir}/{post.commit_repo.replace(':', '-')}_{post.content_identifier}" \
+                      f".{screenshot_encoder.file_extension}"
     if os.path.exists(screenshot_path):
         return screenshot_path
     try:
-        browser.get(post.http_url_to_post)
+        await credential_pool().spend(credentials, Operation.PAGE_LOAD)
+        await browser.get(post.http_url_to_post)
         await asyncio.sleep(8.5)
         logging.info(f"Storing Screenshot of {post.http_url_to_post}")
-        browser.save_screenshot(
-            screenshot_path
-        )
+        try:
+            png = await browser.element_screenshot_as_png(By.XPATH, POST_ELEMENT_XPATH)
+        except NoSuchElementException:
+            logging.warning(f"Post element of {post.http_url_to_post} not found; capturing the whole window")
+            png = await browser.screenshot_as_png()
     except WebDriverException as e:
-        if browser is not None:
-            browser.quit()
-        if retry == retry_limit:
-            logging.error(
-                f"Unrecoverable exception occurred on attempting to screenshot {post.http_url_to_post}; "
-                f"attempt reconnect.",
-                e
-            )
-            return await take_screenshot(post, browser, retry=retry + 1, retry_limit=retry_limit)
-        if retry > retry_limit:
-            if browser is not None:
-                browser.quit()
+        if retry >= retry_limit or browser.broken:
             logging.error(
                 f"Unrecoverable exception occurred on attempting to screenshot {post.http_url_to_post}",
-                e
+                exc_info=e
             )
-            raise e
-        return await take_screenshot(post, retry=retry + 1, retry_limit=retry_limit)
-    finally:
-        if browser is not None:
-            browser.quit()
+            return None
+        return await take_screenshot(post, browser, credentials, retry=retry + 1, retry_limit=retry_limit)
+    await event_loop.run_in_executor(None, screenshot_encoder.encode_to_file, png, screenshot_path)
     return screenshot_path
 
 
 async def __distribute_posts_async__():
-    global observation_subscription
+    global observation_subscription, identity_subscription, digest_task, follow_up_task
     observer = BskyPostObserver()
+    await digest_collector.load()
+    digest_task = event_loop.create_task(send_digests())
+    if load_controller.follow_up_images:
+        follow_up_task = event_loop.create_task(send_follow_up_images())
+    identity_subscription = observer.identities().subscribe(
+        on_next=lambda identity: handle_directory.on_identity(*identity)
+    )
     observation_subscription = observer.posts(
         schedule_s=30.0,
         capacity=250
@@ -144,15 +471,38 @@ async def __distribute_posts_async__():
             await observer.stop()
             logging.warning("FirehoseError occurred; Restarting observation", e)
 
+def setup_distribution(
+        session_maker: sessionmaker,
+        directory: HandleDirectory,
+        index: Optional[SubscriberIndex] = None,
+        bot: Optional[telegram.Bot] = None
+):
+    global async_session, handle_directory, deduplicator, screenshot_encoder, digest_collector, load_controller, \
+        post_hydrator, subscriber_index, telegram_bot
+    async_session = session_maker
+    handle_directory = directory
+    subscriber_index = index
+    telegram_bot = bot
+    deduplicator = DeliveryDeduplicator(snapshot_path=os.environ.get("DEDUPLICATION_SNAPSHOT_PATH"))
+    deduplicator.load_snapshot()
+    screenshot_encoder = ScreenshotEncoder.from_environment()
+    digest_collector = DigestCollector(session_maker)
+    load_controller = LoadController.from_environment()
+    post_hydrator = PostHydrator.from_environment(credential_pool())
+
+
 def distribute_posts():
     asyncio.set_event_loop(loop=event_loop)
     current_dir_path = os.path.dirname(os.path.realpath(__file__))
     event_loop.run_until_complete(
         run_migrations_async(f"{current_dir_path}/alembic", os.environ.get("SQLALCHEMY_URL"))
     )
-    global engine, async_session
+    global engine
     engine = create_async_engine(
         os.environ.get("SQLALCHEMY_URL")
     )
-    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    session_maker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    directory = HandleDirectory(session_maker)
+    setup_distribution(session_maker, directory)
+    event_loop.run_until_complete(directory.load())
     event_loop.run_until_complete(__distribute_posts_async__())
@@ -1,6 +1,12 @@
 import asyncio
 
-from reactivex.scheduler.eventloop import AsyncIOScheduler
-
 event_loop = asyncio.new_event_loop()
-async_io_scheduler = AsyncIOScheduler(loop=event_loop)
+
+
+def __getattr__(name: str):
+    # reactivex is only needed by the distribution; create its scheduler on first access
+    if name == "async_io_scheduler":
+        from reactivex.scheduler.eventloop import AsyncIOScheduler
+        globals()["async_io_scheduler"] = AsyncIOScheduler(loop=event_loop)
+        return globals()["async_io_scheduler"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
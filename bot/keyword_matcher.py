@@ -0,0 +1,57 @@
+from collections import deque
+from typing import List, Set
+
+
+class KeywordMatcher:
+    """ Aho-Corasick automaton over a fixed set of keywords.
+
+    matches() finds every keyword contained in a text in a single pass over it, no matter how many keywords there
+    are. Matching is case-insensitive. """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        # node 0 is the root; per node: transitions, failure link and the keywords ending there
+        self._transitions: List[dict[str, int]] = [{}]
+        self._failure: List[int] = [0]
+        self._outputs: List[Set[int]] = [set()]
+        for index, keyword in enumerate(keywords):
+            self._insert(keyword.casefold(), index)
+        self._link()
+
+    def _insert(self, keyword: str, index: int):
+        node = 0
+        for character in keyword:
+            next_node = self._transitions[node].get(character)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions.append({})
+                self._failure.append(0)
+                self._outputs.append(set())
+                self._transitions[node][character] = next_node
+            node = next_node
+        self._outputs[node].add(index)
+
+    def _link(self):
+        queue = deque(self._transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for character, child in self._transitions[node].items():
+                queue.append(child)
+                failure = self._failure[node]
+                while failure and character not in self._transitions[failure]:
+                    failure = self._failure[failure]
+                self._failure[child] = self._transitions[failure].get(character, 0)
+                self._outputs[child] |= self._outputs[self._failure[child]]
+
+    def matches(self, text: str) -> Set[int]:
+        """ Returns the indexes of all keywords contained in text """
+        matched: Set[int] = set()
+        node = 0
+        transitions, failure, outputs = self._transitions, self._failure, self._outputs
+        for character in text.casefold():
+            while node and character not in transitions[node]:
+                node = failure[node]
+            node = transitions[node].get(character, 0)
+            if outputs[node]:
+                matched |= outputs[node]
+        return matched
@@ -0,0 +1,95 @@
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+
+class LoadController:
+    """ Watches the deliveries waiting to be sent and decides whether posts are to be sent as text only.
+
+    Deliveries are registered per batch. A batch's own deliveries don't count towards the queue depth it's judged by,
+    only the ones of the other batches waiting behind it, so that a post delivered to many chats doesn't degrade
+    delivery by itself. The age of a delivery is measured from when its post was observed, which includes the time
+    the post spent in the observer's buffer.
+
+    Delivery is degraded once more than max_queue_depth deliveries are waiting or the oldest one has been waiting for
+    more than max_age_s seconds, and restored once both are back at or below resume_queue_depth and resume_age_s. The
+    gap between the two pairs of thresholds keeps the mode from flapping. """
+
+    def __init__(
+            self,
+            max_queue_depth: int = 25,
+            max_age_s: float = 120.0,
+            resume_queue_depth: int = 5,
+            resume_age_s: float = 60.0,
+            follow_up_images: bool = False
+    ):
+        self.max_queue_depth = max_queue_depth
+        self.max_age_s = max_age_s
+        self.resume_queue_depth = resume_queue_depth
+        self.resume_age_s = resume_age_s
+        self.follow_up_images = follow_up_images
+        self.degraded_deliveries = 0
+        self._degraded = False
+        self._batches = itertools.count()
+        # observation times of the deliveries still to be sent, per batch, in the order they're sent in
+        self._pending: dict[int, Deque[float]] = {}
+
+    @staticmethod
+    def from_environment() -> 'LoadController':
+        return LoadController(
+            max_queue_depth=int(os.environ.get("LOAD_SHEDDING_QUEUE_DEPTH", "25")),
+            max_age_s=float(os.environ.get("LOAD_SHEDDING_MAX_AGE", "120")),
+            resume_queue_depth=int(os.environ.get("LOAD_SHEDDING_RESUME_QUEUE_DEPTH", "5")),
+            resume_age_s=float(os.environ.get("LOAD_SHEDDING_RESUME_AGE", "60")),
+            follow_up_images=os.environ.get("LOAD_SHEDDING_FOLLOW_UP_IMAGES") == "1"
+        )
+
+    def enqueue(self, observed_ats: List[float]) -> int:
+        """ Registers a batch of deliveries of posts observed at the given time.monotonic() times, in the order they're
+        sent in; returns the batch's ID to pass to done() and finish() """
+        batch = next(self._batches)
+        self._pending[batch] = deque(observed_ats)
+        return batch
+
+    def done(self, batch: int):
+        """ Marks the batch's next delivery as sent """
+        deliveries = self._pending.get(batch)
+        if deliveries:
+            deliveries.popleft()
+
+    def finish(self, batch: int):
+        """ Forgets the batch's deliveries, whether they've been sent or not """
+        self._pending.pop(batch, None)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(deliveries) for deliveries in self._pending.values())
+
+    def backlog(self, batch: Optional[int] = None) -> int:
+        """ The number of deliveries waiting behind the given batch, i.e. in all other batches """
+        return sum(len(deliveries) for other, deliveries in self._pending.items() if other != batch)
+
+    @property
+    def oldest_age_s(self) -> float:
+        observed_ats = [min(deliveries) for deliveries in self._pending.values() if deliveries]
+        if not observed_ats:
+            return 0.0
+        return time.monotonic() - min(observed_ats)
+
+    def is_degraded(self, batch: Optional[int] = None) -> bool:
+        """ Decides for the given batch (or for work outside of any batch if None) """
+        queue_depth, oldest_age_s = self.backlog(batch), self.oldest_age_s
+        if not self._degraded and (queue_depth > self.max_queue_depth or oldest_age_s > self.max_age_s):
+            self._degraded = True
+            logging.warning(
+                f"Delivery fell behind ({queue_depth} waiting, oldest for {oldest_age_s:.0f}s); sending text only"
+            )
+        elif self._degraded and queue_depth <= self.resume_queue_depth and oldest_age_s <= self.resume_age_s:
+            self._degraded = False
+            logging.info(
+                f"Delivery caught up; resuming screenshots after {self.degraded_deliveries} text only deliveries"
+            )
+        return self._degraded
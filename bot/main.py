@@ -1,12 +1,23 @@
 import argparse
+import importlib
 import logging
 import os
 import sys
 
 import dotenv
 
-from distribution_main import distribute_posts
-from subscription_management_main import manage_subscriptions, get_post_info
+# Each mode only imports the module it runs, so that e.g. the subscription bot never loads selenium
+EXEC_MODES = {
+    'manage_subscriptions': ('subscription_management_main', 'manage_subscriptions'),
+    'distribute_content': ('distribution_main', 'distribute_posts'),
+    'combined': ('combined_main', 'run_combined'),
+}
+
+
+def run(exec_mode: str):
+    module_name, function_name = EXEC_MODES[exec_mode]
+    getattr(importlib.import_module(module_name), function_name)()
+
 
 if __name__ == '__main__':
     dotenv.load_dotenv()
@@ -28,13 +39,8 @@ if __name__ == '__main__':
     exec_mode = os.environ.get("EXEC_MODE")
     if exec_mode is None:
         parser = argparse.ArgumentParser()
-        parser.add_argument('-m', choices=['manage_subscriptions', 'distribute_content'])
+        parser.add_argument('-m', choices=list(EXEC_MODES.keys()))
         args = parser.parse_args()
-        if args.m == 'manage_subscriptions':
-            manage_subscriptions()
-        elif args.m == 'distribute_content':
-            distribute_posts()
-    elif exec_mode == 'manage_subscriptions':
-        manage_subscriptions()
-    elif exec_mode == 'distribute_content':
-        distribute_posts()
+        exec_mode = args.m
+    if exec_mode in EXEC_MODES:
+        run(exec_mode)
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, String
+from sqlalchemy.orm import Mapped
+
+from model.base import Base
+
+
+class KnownHandle(Base):
+    """ The last known handle of a subscribed DID """
+    __tablename__ = "known_handle"
+    did: Mapped[str] = Column(String, primary_key=True)
+    handle: Mapped[str] = Column(String, nullable=False)
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, String, Integer, BigInteger, Float
+from sqlalchemy.orm import Mapped
+
+from model.base import Base
+
+
+class PendingDigestPost(Base):
+    """ A post collected for a chat's digest that hasn't been sent yet, so that restarts don't lose it """
+    __tablename__ = "pending_digest_post"
+    id: Mapped[int] = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = Column(BigInteger, nullable=False, index=True)
+    commit_repo: Mapped[str] = Column(String, nullable=False)
+    content_identifier: Mapped[str] = Column(String, nullable=False)
+    text: Mapped[str] = Column(String, nullable=False)
+    # seconds since the epoch at which the chat's digest is due at the latest
+    due_at: Mapped[float] = Column(Float, nullable=False)
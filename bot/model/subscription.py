@@ -1,11 +1,22 @@
+from typing import Optional
+
 from sqlalchemy import Column, String, Integer, BigInteger
 from sqlalchemy.orm import Mapped
 
 from model.base import Base
 
+INSTANT_DELIVERY = "instant"
+DIGEST_DELIVERY = "digest"
+DEFAULT_DIGEST_INTERVAL_MINUTES = 60
+
 
 class Subscription(Base):
     __tablename__ = "subscription"
     id: Mapped[int] = Column(Integer, primary_key=True, autoincrement=True)
     chat_id: Mapped[int] = Column(BigInteger, nullable=False)
     did: Mapped[str] = Column(String, nullable=False)
+    # posts of digest subscriptions are collected for digest_interval minutes and sent as a single text message
+    delivery_mode: Mapped[str] = Column(
+        String, nullable=False, default=INSTANT_DELIVERY, server_default=INSTANT_DELIVERY
+    )
+    digest_interval: Mapped[Optional[int]] = Column(Integer, nullable=True)
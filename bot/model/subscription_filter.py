@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean
+from sqlalchemy.orm import Mapped
+
+from model.base import Base
+
+
+class SubscriptionFilter(Base):
+    """ A keyword or regular expression a post of the subscribed DID has to match to be delivered to the chat """
+    __tablename__ = "subscription_filter"
+    id: Mapped[int] = Column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = Column(BigInteger, nullable=False)
+    did: Mapped[str] = Column(String, nullable=False, index=True)
+    pattern: Mapped[str] = Column(String, nullable=False)
+    is_regex: Mapped[bool] = Column(Boolean, nullable=False, default=False)
@@ -1,16 +1,35 @@
+import logging
+from typing import Optional
+
 from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from sqlalchemy.ext.asyncio import create_async_engine
 
-from alembic import command
+
+def __current_revision__(connection) -> Optional[str]:
+    return MigrationContext.configure(connection).get_current_revision()
+
 
 def __run_migrations__(connection, script_location: str, dsn: str) -> None:
-    print('Running DB migrations in %r on %r', script_location, dsn)
     alembic_cfg = Config()
     alembic_cfg.set_main_option('script_location', script_location)
     alembic_cfg.set_main_option('sqlalchemy.url', dsn)
+    head = ScriptDirectory.from_config(alembic_cfg).get_current_head()
+    if __current_revision__(connection) == head:
+        logging.info(f"Database is at head revision {head}; skipping migrations")
+        return
+    # alembic's command module is comparatively expensive to import and only needed on actual upgrades
+    from alembic import command
+    logging.info(f"Running DB migrations in {script_location} up to {head}")
+    alembic_cfg.attributes['connection'] = connection
     command.upgrade(alembic_cfg, 'head')
 
+
 async def run_migrations_async(script_location: str, dsn: str, *args, **kwargs) -> None:
-    async_engine = create_async_engine("sqlite+aiosqlite://", echo=True)
-    async with async_engine.begin() as conn:
-        await conn.run_sync(__run_migrations__, script_location, dsn)
+    async_engine = create_async_engine(dsn)
+    try:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(__run_migrations__, script_location, dsn)
+    finally:
+        await async_engine.dispose()
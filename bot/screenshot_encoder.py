@@ -0,0 +1,75 @@
+import io
+import logging
+import os
+
+from PIL import Image
+
+FORMATS = {"png": "PNG", "jpeg": "JPEG", "webp": "WEBP"}
+FILE_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+
+class ScreenshotEncoder:
+    """ Re-encodes the PNG screenshots taken by the webdriver into a smaller format before they're uploaded.
+
+    Screenshots wider than max_width are downscaled first; Telegram shows photos at up to 1280 px anyway. Encoding is
+    CPU bound, so it's meant to be run in an executor rather than on the event loop. """
+
+    def __init__(self, image_format: str = "jpeg", quality: int = 80, max_width: int = 1280):
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported screenshot format {image_format}; use one of {', '.join(FORMATS)}")
+        self.image_format = image_format
+        self.quality = quality
+        self.max_width = max_width
+        self.encoded = 0
+        self.original_bytes = 0
+        self.encoded_bytes = 0
+
+    @staticmethod
+    def from_environment() -> 'ScreenshotEncoder':
+        return ScreenshotEncoder(
+            image_format=os.environ.get("SCREENSHOT_FORMAT", "jpeg").lower(),
+            quality=int(os.environ.get("SCREENSHOT_QUALITY", "80")),
+            max_width=int(os.environ.get("SCREENSHOT_MAX_WIDTH", "1280"))
+        )
+
+    @property
+    def file_extension(self) -> str:
+        return FILE_EXTENSIONS[self.image_format]
+
+    def encode(self, png: bytes) -> bytes:
+        with Image.open(io.BytesIO(png)) as image:
+            image.load()
+            if image.width > self.max_width:
+                image = image.resize(
+                    (self.max_width, round(image.height * self.max_width / image.width)),
+                    Image.Resampling.LANCZOS
+                )
+            output = io.BytesIO()
+            if self.image_format == "png":
+                image.save(output, FORMATS[self.image_format], optimize=True)
+            else:
+                # neither format makes use of the alpha channel of a screenshot
+                image.convert("RGB").save(output, FORMATS[self.image_format], quality=self.quality, optimize=True)
+        encoded = output.getvalue()
+        self.encoded += 1
+        self.original_bytes += len(png)
+        self.encoded_bytes += len(encoded)
+        return encoded
+
+    def encode_to_file(self, png: bytes, path: str) -> int:
+        """ Encodes png and writes it to path; returns the number of bytes saved """
+        encoded = self.encode(png)
+        with open(path, "wb") as file:
+            file.write(encoded)
+        saved = len(png) - len(encoded)
+        logging.info(
+            f"Encoded screenshot {os.path.basename(path)}: {len(png)} -> {len(encoded)} bytes "
+            f"({saved / len(png):.0%} saved)"
+        )
+        return saved
+
+    @property
+    def saved_ratio(self) -> float:
+        if not self.original_bytes:
+            return 0.0
+        return 1 - self.encoded_bytes / self.original_bytes
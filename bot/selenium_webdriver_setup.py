@@ -1,52 +1,40 @@
 import asyncio
 import logging
 import os
-from datetime import datetime
 from typing import Optional
 
 from selenium.common import NoSuchElementException
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webdriver import WebDriver
 
+from async_webdriver import AsyncWebDriver
 from bsky.bluesky_credentials import BlueSkyCredentials
+from bsky.credential_pool import credential_pool, Operation, RateLimitExceeded
 
 WINDOW_SIZE = "--window-size=600,1000"
-latest_rate_limit_exceed: Optional[datetime] = None
 
 
-async def setup_selenium() -> Optional[WebDriver]:
-    global latest_rate_limit_exceed
-    if latest_rate_limit_exceed is None:
-        primary_credentials = BlueSkyCredentials(
-            user_name=os.environ.get("OBSERVER_LOGIN"),
-            password=os.environ.get("OBSERVER_PASSWORD")
-        )
-        driver = await __setup_selenium__(
-            credentials=primary_credentials
-        )
+async def setup_selenium() -> tuple[Optional[AsyncWebDriver], Optional[BlueSkyCredentials]]:
+    """ Returns a browser signed in with an observer account that isn't rate limited, and that account """
+    pool = credential_pool()
+    while True:
+        credentials = pool.acquire(Operation.LOGIN, Operation.PAGE_LOAD)
+        if credentials is None:
+            logging.warning("All observer accounts are rate limited or out of budget")
+            return None, None
+        try:
+            driver = await __setup_selenium__(credentials=credentials)
+        except RateLimitExceeded as e:
+            pool.report_rate_limited(credentials, e.retry_after_s)
+            continue
         if driver is not None:
-            return driver
-        if primary_credentials.user_name and primary_credentials.password:
-            latest_rate_limit_exceed = datetime.utcnow()
-            logging.warning(f"Rate limit exceeded for {primary_credentials.user_name}")
-            return await setup_selenium()
-        return None
-    delta = (datetime.utcnow() - latest_rate_limit_exceed).days
-    if delta < 1:
-        return await __setup_selenium__(
-            credentials=BlueSkyCredentials(
-                user_name=os.environ.get("OBSERVER_LOGIN_ALTERNATIVE"),
-                password=os.environ.get("OBSERVER_PASSWORD_ALTERNATIVE")
-            )
-        )
-    latest_rate_limit_exceed = None
-    return await setup_selenium()
+            pool.report_success(credentials)
+        return driver, credentials
 
 
 async def __setup_selenium__(
     credentials: BlueSkyCredentials
-) -> Optional[WebDriver]:
+) -> Optional[AsyncWebDriver]:
     if not credentials.user_name or not credentials.password:
         return None
     logging.info("Setting up Selenium")
@@ -55,45 +43,50 @@ async def __setup_selenium__(
         driver_opts.add_argument(WINDOW_SIZE)
         driver_opts.add_argument("--headless")
         driver_opts.binary_location = os.environ.get("LOCAL_DEVELOPMENT_CHROME_BINARY")
-        driver = webdriver.Chrome(options=driver_opts)
+        driver = await AsyncWebDriver.create(lambda: webdriver.Chrome(options=driver_opts))
     else:
         # let's give chromium standalone some time to boot
         await asyncio.sleep(2)
         driver_opts = webdriver.ChromeOptions()
         driver_opts.add_argument("--headless")
         driver_opts.add_argument(WINDOW_SIZE)
-        driver = webdriver.Remote(
+        driver = await AsyncWebDriver.create(lambda: webdriver.Remote(
             options=driver_opts,
             command_executor="http://chrome:4444"
-        )
-
-    driver.get("https://bsky.app")
-    await asyncio.sleep(2)
-    sign_in_button = driver.find_element(
-        By.XPATH,
-        "//nav[@role='navigation']/div/div[position()=2]/button[position()=2]"
-    )
-    sign_in_button.click()
+        ))
 
-    username_field = driver.find_element(
-        By.XPATH,
-        "//input[@data-testid='loginUsernameInput']"
-    )
-    password_field = driver.find_element(
-        By.XPATH,
-        "//input[@data-testid='loginPasswordInput']"
-    )
-    username_field.send_keys(credentials.user_name)
-    password_field.send_keys(credentials.password)
-    await asyncio.sleep(8)
-    sign_in_button = driver.find_element(
-        By.XPATH,
-        "//button[@data-testid='loginNextButton']"
-    )
-    sign_in_button.click()
-    await asyncio.sleep(5)
     try:
-        driver.find_element(By.XPATH, "//*[contains(text(), 'Rate Limit Exceeded')]")
-    except NoSuchElementException:
-        return driver
-    return None
+        await driver.get("https://bsky.app")
+        await asyncio.sleep(2)
+        sign_in_button = await driver.find_element(
+            By.XPATH,
+            "//nav[@role='navigation']/div/div[position()=2]/button[position()=2]"
+        )
+        await driver.click(sign_in_button)
+
+        username_field = await driver.find_element(
+            By.XPATH,
+            "//input[@data-testid='loginUsernameInput']"
+        )
+        password_field = await driver.find_element(
+            By.XPATH,
+            "//input[@data-testid='loginPasswordInput']"
+        )
+        await driver.send_keys(username_field, credentials.user_name)
+        await driver.send_keys(password_field, credentials.password)
+        await asyncio.sleep(8)
+        sign_in_button = await driver.find_element(
+            By.XPATH,
+            "//button[@data-testid='loginNextButton']"
+        )
+        await driver.click(sign_in_button)
+        await asyncio.sleep(5)
+        try:
+            await driver.find_element(By.XPATH, "//*[contains(text(), 'Rate Limit Exceeded')]")
+        except NoSuchElementException:
+            return driver
+    except BaseException:
+        await driver.quit()
+        raise
+    await driver.quit()
+    raise RateLimitExceeded()
@@ -0,0 +1,47 @@
+from typing import Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from model.subscription import Subscription
+
+
+class SubscriberIndex:
+    """ All subscriptions, indexed by the subscribed DID.
+
+    Used when the subscription bot and the distribution run in the same process: the bot's commands update the index
+    right away, so the distribution neither has to query the database per batch nor wait for changes to show up. """
+
+    def __init__(self):
+        self._subscriptions: dict[str, dict[int, Subscription]] = {}
+
+    async def load(self, async_session: sessionmaker):
+        sql_session: AsyncSession
+        async with async_session() as sql_session:
+            subscriptions = (await sql_session.scalars(select(Subscription))).all()
+        self._subscriptions = {}
+        for subscription in subscriptions:
+            self.add(subscription)
+
+    def add(self, subscription: Subscription):
+        self._subscriptions.setdefault(subscription.did, {})[subscription.chat_id] = subscription
+
+    def remove(self, chat_id: int, did: str):
+        chats = self._subscriptions.get(did)
+        if chats is None:
+            return
+        chats.pop(chat_id, None)
+        if not chats:
+            del self._subscriptions[did]
+
+    def remove_chat(self, chat_id: int):
+        for did in [did for did, chats in self._subscriptions.items() if chat_id in chats]:
+            self.remove(chat_id, did)
+
+    def subscriptions_for(self, dids: Iterable[str]) -> List[Subscription]:
+        return [
+            subscription
+            for did in set(dids)
+            for subscription in self._subscriptions.get(did, {}).values()
+        ]
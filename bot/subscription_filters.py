@@ -0,0 +1,122 @@
+import logging
+import re
+from typing import List, Iterable, Set, Optional, Iterator
+
+from keyword_matcher import KeywordMatcher
+from model.subscription_filter import SubscriptionFilter
+
+try:
+    # the parser re compiles with; private, tests/test_subscription_filters.py checks it's still there
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+MAX_REGEX_LENGTH = 100
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+
+def _nested_sequences(av) -> Iterator[sre_parse.SubPattern]:
+    """ The sequences nested in an argument of the parsed expression, e.g. a group's or a repeat's body """
+    for value in av if isinstance(av, (tuple, list)) else ():
+        if isinstance(value, sre_parse.SubPattern):
+            yield value
+        elif isinstance(value, (tuple, list)):
+            yield from _nested_sequences(value)
+
+
+def _has_variable_repeat(sequence: sre_parse.SubPattern) -> bool:
+    for op, av in sequence:
+        if op in _REPEATS and av[0] != av[1]:
+            return True
+        if any(_has_variable_repeat(nested) for nested in _nested_sequences(av)):
+            return True
+    return False
+
+
+def _has_nested_quantifiers(sequence: sre_parse.SubPattern) -> bool:
+    for op, av in sequence:
+        if op in _REPEATS and av[1] > 1 and _has_variable_repeat(av[2]):
+            return True
+        if any(_has_nested_quantifiers(nested) for nested in _nested_sequences(av)):
+            return True
+    return False
+
+
+def compile_filter_expression(pattern: str) -> re.Pattern:
+    """ Compiles a filter's regular expression. Filters are matched on the event loop, so expressions with a
+    variable quantifier inside another quantifier, such as (a+)+$ or (\\w+\\s?)*, whose matching may take exponential
+    time, are rejected with re.error as well. Quantifiers of a fixed count, as in (\\d{3}-)+, are fine. """
+    if _has_nested_quantifiers(sre_parse.parse(pattern, re.IGNORECASE)):
+        raise re.error("it could take too long to match, as it has nested quantifiers")
+    return re.compile(pattern, re.IGNORECASE)
+
+
+class DidFilters:
+    """ The filters all chats have set on their subscription of a single DID, compiled into one keyword matcher and
+    a list of regular expressions """
+
+    def __init__(self, filters: List[SubscriptionFilter]):
+        self.fingerprint = DidFilters.fingerprint_of(filters)
+        self.filtered_chats: Set[int] = {subscription_filter.chat_id for subscription_filter in filters}
+        keyword_filters = [subscription_filter for subscription_filter in filters if not subscription_filter.is_regex]
+        self._keyword_chats = [subscription_filter.chat_id for subscription_filter in keyword_filters]
+        self._keywords = KeywordMatcher([subscription_filter.pattern for subscription_filter in keyword_filters])
+        self._expressions = []
+        for subscription_filter in filters:
+            if not subscription_filter.is_regex:
+                continue
+            try:
+                self._expressions.append(
+                    (subscription_filter.chat_id, compile_filter_expression(subscription_filter.pattern))
+                )
+            except re.error as e:
+                logging.warning(f"Ignoring invalid filter {subscription_filter.pattern}: {e}")
+
+    @staticmethod
+    def fingerprint_of(filters: List[SubscriptionFilter]) -> frozenset:
+        return frozenset(
+            (subscription_filter.chat_id, subscription_filter.pattern, subscription_filter.is_regex)
+            for subscription_filter in filters
+        )
+
+    def matching_chats(self, text: str) -> Set[int]:
+        chats = {self._keyword_chats[index] for index in self._keywords.matches(text)}
+        for chat_id, expression in self._expressions:
+            if chat_id not in chats and expression.search(text):
+                chats.add(chat_id)
+        return chats
+
+
+class SubscriptionFilters:
+    """ Decides which chats receive a post of a DID they're subscribed to.
+
+    A chat without filters on its subscription receives every post; a chat with filters only the posts matching at
+    least one of them. The compiled filters of a DID are kept until its filters change. """
+
+    def __init__(self):
+        self._filters: dict[str, DidFilters] = {}
+
+    def update(self, dids: Iterable[str], filters: List[SubscriptionFilter]):
+        """ Replaces the filters of the given DIDs with filters, recompiling only the DIDs whose filters changed """
+        by_did: dict[str, List[SubscriptionFilter]] = {did: [] for did in dids}
+        for subscription_filter in filters:
+            by_did.setdefault(subscription_filter.did, []).append(subscription_filter)
+        for did, did_filters in by_did.items():
+            if not did_filters:
+                self._filters.pop(did, None)
+                continue
+            current = self._filters.get(did)
+            if current is None or current.fingerprint != DidFilters.fingerprint_of(did_filters):
+                self._filters[did] = DidFilters(did_filters)
+
+    def matching_chats(self, did: str, text: str) -> Optional[Set[int]]:
+        """ Returns the chats with filters on did that text matches, or None if no chat filters did at all """
+        did_filters = self._filters.get(did)
+        if did_filters is None:
+            return None
+        return did_filters.matching_chats(text)
+
+    def filtered_chats(self, did: str) -> Set[int]:
+        did_filters = self._filters.get(did)
+        return did_filters.filtered_chats if did_filters is not None else set()
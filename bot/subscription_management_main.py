@@ -1,26 +1,46 @@
 import asyncio
 import logging
 import os
+import re
+import secrets
 from typing import Optional, List
 
 import telegram.ext.filters
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, insert, update
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from telegram import Update
+from telegram import Update, Message
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes, CommandHandler, Application, MessageHandler
 
-from bsky.bluesky_credentials import BlueSkyCredentials
-from bsky.bsky_api_extensions import fetch_handle, fetch_did, find_users, \
-    get_post_info
+from bsky.bsky_api_extensions import fetch_did, find_users, get_post_info, get_graph_record_from_url, \
+    fetch_starter_pack_list_uri, fetch_list_members, STARTER_PACK_COLLECTION
+from bsky.credential_pool import credential_pool, Operation
+from bsky.handle_directory import HandleDirectory
 from event_loop import event_loop
-from model.subscription import Subscription
+from model.subscription import Subscription, INSTANT_DELIVERY, DIGEST_DELIVERY, DEFAULT_DIGEST_INTERVAL_MINUTES
+from model.subscription_filter import SubscriptionFilter
 from run_migrations import run_migrations_async
 from telegram_extensions import link
+from subscriber_index import SubscriberIndex
+from subscription_filters import MAX_REGEX_LENGTH, compile_filter_expression
+from telegram_webhook import TelegramWebhookServer
 
 engine: Optional[AsyncEngine] = None
 async_session: Optional[sessionmaker] = None
+handle_directory: Optional[HandleDirectory] = None
+# only set if running alongside the distribution, which is notified of subscription changes through it
+subscriber_index: Optional[SubscriberIndex] = None
+
+
+async def resolve_account(identifier: str) -> tuple[Optional[str], Optional[str]]:
+    """ Returns the DID and handle of the account with the given DID or handle, or (None, None) if there's none """
+    identifier = identifier.lstrip("@")
+    if identifier.startswith("did:"):
+        handle = await handle_directory.handle_for(identifier)
+        return (identifier, handle) if handle is not None else (None, None)
+    did = await fetch_did(identifier)
+    return (did, identifier) if did is not None else (None, None)
 
 async def get_post_info_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.message if update.message else update.channel_post
@@ -37,10 +57,10 @@ async def get_post_info_command(update: Update, context: ContextTypes.DEFAULT_TY
             f"\n\nUsage: /post someone.bsky.social https://bsky.app/profile/did:plc:5n3pxz7xpnrzuxprkjewbki/post/gkklcv73c26"
         )
         return
-    post_info = get_post_info(post_url, credentials=BlueSkyCredentials(
-        user_name=os.environ.get("OBSERVER_LOGIN_ALTERNATIVE"),
-        password=os.environ.get("OBSERVER_PASSWORD_ALTERNATIVE")
-    ))
+    post_info = await credential_pool().run(
+        lambda credentials: event_loop.run_in_executor(None, get_post_info, post_url, credentials),
+        Operation.LOGIN, Operation.GET_POST
+    )
     if post_info is None:
         await message.reply_text(
             f"{post_url} is not a valid post URL, such as https://bsky.app/profile/did:plc:5n3pxz7xpnrzuxprkjewbki/post/gkklcv73c26."
@@ -64,7 +84,8 @@ async def list_subscriptions_command(update: Update, context: ContextTypes.DEFAU
                 f"You have {len(subscriptions)} active subscription(s). Calculating .."
             )
             accounts = [s._data[0].did for s in subscriptions]
-            accounts = [f"- {await fetch_handle(did)}" for did in accounts]
+            handles = await handle_directory.handles_for(accounts)
+            accounts = [f"- {handles[did] if handles[did] is not None else did}" for did in accounts]
             await update.get_bot().send_message(
                 chat_id=message.chat_id,
                 text="\t\n".join([handle for handle in accounts if handle is not None])
@@ -85,7 +106,13 @@ async def unsubscribe_all_command(update: Update, context: ContextTypes.DEFAULT_
         await sql_session.execute(
             delete(Subscription).where(Subscription.chat_id == chat_id)
         )
+        await sql_session.execute(
+            delete(SubscriptionFilter).where(SubscriptionFilter.chat_id == chat_id)
+        )
         await sql_session.commit()
+        if subscriber_index is not None:
+            subscriber_index.remove_chat(chat_id)
+        await handle_directory.prune()
         await message.reply_text(
             f"Unsubscribed from all"
         )
@@ -108,10 +135,7 @@ async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"\n\nUsage: /unfollow someone.bsky.social"
         )
         return
-    fetched_handle = await fetch_handle(message_arg)
-    fetched_did = await fetch_did(message_arg)
-    did = fetched_did if fetched_did is not None else message_arg if fetched_handle is not None else None
-    handle = fetched_handle if fetched_handle is not None else message_arg if fetched_did is not None else None
+    did, handle = await resolve_account(message_arg)
     if did is None:
         await message.reply_text(
             f"User not found: {message_arg}" if "bsky.social" in message_arg else f"User not found: {message_arg}. Did you mean"
@@ -123,7 +147,13 @@ async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await sql_session.execute(
             delete(Subscription).where(Subscription.chat_id == chat_id).where(Subscription.did == did)
         )
+        await sql_session.execute(
+            delete(SubscriptionFilter).where(SubscriptionFilter.chat_id == chat_id).where(SubscriptionFilter.did == did)
+        )
         await sql_session.commit()
+        if subscriber_index is not None:
+            subscriber_index.remove(chat_id, did)
+        await handle_directory.prune()
         url = f"https://bsky.app/profile/{did}"
         await message.reply_text(
             f"Unsubscribed from {link(url=url, caption=handle if handle is not None else message_arg)}",
@@ -148,10 +178,7 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
             f"\n\nUsage: /follow someone.bsky.social"
         )
         return
-    fetched_handle = await fetch_handle(message_arg)
-    fetched_did = await fetch_did(message_arg)
-    did = fetched_did if fetched_did is not None else message_arg if fetched_handle is not None else None
-    handle = fetched_handle if fetched_handle is not None else message_arg if fetched_did is not None else None
+    did, handle = await resolve_account(message_arg)
     logging.info(f"Received subscription request for {message_arg} for chat with ID {message.chat_id}")
     if did is None:
         await message.reply_text(
@@ -167,14 +194,299 @@ async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         if subscription.first() is None:
             logging.info(f"Subscribing to {did} for chat with ID {chat_id}")
-            sql_session.add(Subscription(chat_id=chat_id, did=did))
+            new_subscription = Subscription(chat_id=chat_id, did=did, delivery_mode=INSTANT_DELIVERY)
+            sql_session.add(new_subscription)
             await sql_session.commit()
+            if subscriber_index is not None:
+                subscriber_index.add(new_subscription)
+        await handle_directory.remember(did, handle)
         link_to_profile = link(f"https://bsky.app/profile/{did}", caption=handle if handle is not None else message_arg)
         await message.reply_text(
             f"Successfully subscribed to {handle if handle is not None else message_arg}"
         )
 
 
+async def resolve_accounts(identifiers: List[str], concurrency: int = 8) -> dict[str, tuple[Optional[str], Optional[str]]]:
+    """ Resolves the given DIDs, handles, list and starter pack URLs concurrently.
+    Returns (DID, handle) per account, keyed by identifier; lists and starter packs are expanded into their members. """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def resolve(identifier: str) -> List[tuple[str, tuple[Optional[str], Optional[str]]]]:
+        async with semaphore:
+            profile, collection, rkey = get_graph_record_from_url(identifier)
+            if collection is None:
+                return [(identifier, await resolve_account(identifier))]
+            profile_did = profile if profile.startswith("did:") else await fetch_did(profile)
+            if profile_did is None:
+                return [(identifier, (None, None))]
+            list_uri = f"at://{profile_did}/{collection}/{rkey}"
+            if collection == STARTER_PACK_COLLECTION:
+                list_uri = await fetch_starter_pack_list_uri(list_uri)
+            members = await fetch_list_members(list_uri) if list_uri is not None else None
+            if not members:
+                return [(identifier, (None, None))]
+            return [(did, (did, handle)) for did, handle in members]
+
+    resolved = await asyncio.gather(*[resolve(identifier) for identifier in dict.fromkeys(identifiers)])
+    return {identifier: account for accounts in resolved for identifier, account in accounts}
+
+
+async def bulk_subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    global engine
+    global async_session
+    message = update.message if update.message else update.channel_post
+    message_args: Optional[List[str]] = None
+    if update.channel_post:
+        args = message.text.split(" ")
+        args.pop(0)
+        message_args = args
+    elif update.message:
+        message_args = context.args
+    identifiers = [
+        identifier for arg in (message_args or []) for identifier in arg.replace(",", " ").split() if identifier
+    ]
+    if not identifiers:
+        await message.reply_text(
+            f"You didn't provide any DIDs, handles, list or starter pack URLs."
+            f"\n\nUsage: /followmany someone.bsky.social someone-else.bsky.social "
+            f"https://bsky.app/profile/someone.bsky.social/lists/3kabc"
+        )
+        return
+    await message.reply_text(f"Resolving {len(identifiers)} account(s), list(s) or starter pack(s) ..")
+    resolved = await resolve_accounts(identifiers)
+    accounts = {did: handle for did, handle in resolved.values() if did is not None}
+    not_found = [identifier for identifier, (did, _) in resolved.items() if did is None]
+
+    chat_id = message.chat_id
+    logging.info(f"Received bulk subscription request for {len(accounts)} accounts for chat with ID {chat_id}")
+    sql_session: AsyncSession
+    async with async_session() as sql_session:
+        already_subscribed = set((await sql_session.scalars(
+            select(Subscription.did).where(Subscription.chat_id == chat_id).where(Subscription.did.in_(accounts.keys()))
+        )).all())
+        new_dids = [did for did in accounts if did not in already_subscribed]
+        if new_dids:
+            await sql_session.execute(insert(Subscription), [{"chat_id": chat_id, "did": did} for did in new_dids])
+            await sql_session.commit()
+            if subscriber_index is not None:
+                for did in new_dids:
+                    # column defaults only apply on insert, so they're set explicitly on these transient objects
+                    subscriber_index.add(
+                        Subscription(chat_id=chat_id, did=did, delivery_mode=INSTANT_DELIVERY, digest_interval=None)
+                    )
+    await handle_directory.remember_all({did: handle for did, handle in accounts.items() if handle is not None})
+
+    summary = f"Subscribed to {len(new_dids)} new account(s)"
+    if already_subscribed:
+        summary += f", {len(already_subscribed)} were already followed"
+    if not_found:
+        shown = not_found[:20]
+        summary += f".\n\nNot found: {', '.join(shown)}"
+        if len(not_found) > len(shown):
+            summary += f" and {len(not_found) - len(shown)} more"
+    await message.reply_text(summary, disable_web_page_preview=True)
+
+
+async def set_delivery_mode(
+        message: Message,
+        identifier: str,
+        delivery_mode: str,
+        digest_interval: Optional[int] = None
+) -> None:
+    did, handle = await resolve_account(identifier)
+    if did is None:
+        await message.reply_text(f"User not found: {identifier}")
+        return
+    chat_id = message.chat_id
+    sql_session: AsyncSession
+    async with async_session() as sql_session:
+        result = await sql_session.execute(
+            update(Subscription)
+            .where(Subscription.chat_id == chat_id)
+            .where(Subscription.did == did)
+            .values(delivery_mode=delivery_mode, digest_interval=digest_interval)
+        )
+        await sql_session.commit()
+        if result.rowcount == 0:
+            await message.reply_text(f"You're not following {handle}. Use /follow {handle} first.")
+            return
+        if subscriber_index is not None:
+            subscriber_index.add((await sql_session.scalars(
+                select(Subscription).where(Subscription.chat_id == chat_id).where(Subscription.did == did)
+            )).first())
+    url = f"https://bsky.app/profile/{did}"
+    if delivery_mode == DIGEST_DELIVERY:
+        text = f"Posts of {link(url=url, caption=handle)} will be sent as a digest every {digest_interval} minutes"
+    else:
+        text = f"Posts of {link(url=url, caption=handle)} will be sent right away"
+    await message.reply_text(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
+
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message if update.message else update.channel_post
+    message_args: Optional[List[str]] = None
+    if update.channel_post:
+        args = message.text.split(" ")
+        args.pop(0)
+        message_args = args
+    elif update.message:
+        message_args = context.args
+    if not message_args:
+        await message.reply_text(
+            f"You didn't provide a DID or handle, such as someone.bsky.social."
+            f"\n\nUsage: /digest someone.bsky.social {DEFAULT_DIGEST_INTERVAL_MINUTES}"
+        )
+        return
+    digest_interval = DEFAULT_DIGEST_INTERVAL_MINUTES
+    if len(message_args) > 1:
+        try:
+            digest_interval = int(message_args[1])
+        except ValueError:
+            digest_interval = None
+        if digest_interval is None or not 5 <= digest_interval <= 24 * 60:
+            await message.reply_text(
+                f"{message_args[1]} is not a number of minutes between 5 and 1440."
+                f"\n\nUsage: /digest someone.bsky.social {DEFAULT_DIGEST_INTERVAL_MINUTES}"
+            )
+            return
+    await set_delivery_mode(message, message_args[0], DIGEST_DELIVERY, digest_interval)
+
+
+async def instant_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message if update.message else update.channel_post
+    message_arg: Optional[str] = None
+    if update.channel_post:
+        args = message.text.split(" ")
+        args.pop(0)
+        message_arg = args[0] if args else None
+    elif update.message:
+        message_arg = context.args[0] if context.args and update else None
+    if message_arg is None:
+        await message.reply_text(
+            f"You didn't provide a DID or handle, such as someone.bsky.social."
+            f"\n\nUsage: /instant someone.bsky.social"
+        )
+        return
+    await set_delivery_mode(message, message_arg, INSTANT_DELIVERY)
+
+
+MAX_FILTERS_PER_SUBSCRIPTION = 50
+
+
+def command_args(update: Update, context: ContextTypes.DEFAULT_TYPE) -> List[str]:
+    if update.channel_post:
+        args = update.channel_post.text.split(" ")
+        args.pop(0)
+        return [arg for arg in args if arg]
+    return context.args or []
+
+
+async def is_subscribed(sql_session: AsyncSession, chat_id: int, did: str) -> bool:
+    return (await sql_session.scalars(
+        select(Subscription.id).where(Subscription.chat_id == chat_id).where(Subscription.did == did)
+    )).first() is not None
+
+
+async def add_filter(update: Update, context: ContextTypes.DEFAULT_TYPE, is_regex: bool) -> None:
+    message = update.message if update.message else update.channel_post
+    command = "/filterregex" if is_regex else "/filter"
+    example = "climate (change|crisis)" if is_regex else "climate change"
+    args = command_args(update, context)
+    if len(args) < 2:
+        await message.reply_text(
+            f"You didn't provide a DID or handle and a {'regular expression' if is_regex else 'keyword'}."
+            f"\n\nUsage: {command} someone.bsky.social {example}"
+        )
+        return
+    pattern = " ".join(args[1:])
+    if is_regex:
+        if len(pattern) > MAX_REGEX_LENGTH:
+            await message.reply_text(f"Regular expressions may be at most {MAX_REGEX_LENGTH} characters long.")
+            return
+        try:
+            compile_filter_expression(pattern)
+        except re.error as e:
+            await message.reply_text(f"{pattern} is not a valid regular expression: {e}")
+            return
+    did, handle = await resolve_account(args[0])
+    if did is None:
+        await message.reply_text(f"User not found: {args[0]}")
+        return
+    chat_id = message.chat_id
+    sql_session: AsyncSession
+    async with async_session() as sql_session:
+        if not await is_subscribed(sql_session, chat_id, did):
+            await message.reply_text(f"You're not following {handle}. Use /follow {handle} first.")
+            return
+        filter_count = len((await sql_session.scalars(
+            select(SubscriptionFilter.id)
+            .where(SubscriptionFilter.chat_id == chat_id)
+            .where(SubscriptionFilter.did == did)
+        )).all())
+        if filter_count >= MAX_FILTERS_PER_SUBSCRIPTION:
+            await message.reply_text(f"You can't set more than {MAX_FILTERS_PER_SUBSCRIPTION} filters per account.")
+            return
+        sql_session.add(SubscriptionFilter(chat_id=chat_id, did=did, pattern=pattern, is_regex=is_regex))
+        await sql_session.commit()
+    await message.reply_text(
+        f"You'll only receive posts of {handle} matching any of its {filter_count + 1} filter(s) from now on.",
+        disable_web_page_preview=True
+    )
+
+
+async def filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await add_filter(update, context, is_regex=False)
+
+
+async def filter_regex_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await add_filter(update, context, is_regex=True)
+
+
+async def list_filters_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message if update.message else update.channel_post
+    sql_session: AsyncSession
+    async with async_session() as sql_session:
+        filters = (await sql_session.scalars(
+            select(SubscriptionFilter)
+            .where(SubscriptionFilter.chat_id == message.chat_id)
+            .order_by(SubscriptionFilter.did, SubscriptionFilter.id)
+        )).all()
+    if not filters:
+        await message.reply_text("You have no filters; you receive every post of the users you follow.")
+        return
+    handles = await handle_directory.handles_for({subscription_filter.did for subscription_filter in filters})
+    lines = [
+        f"- {handles[subscription_filter.did] or subscription_filter.did}: "
+        f"{'regex ' if subscription_filter.is_regex else ''}{subscription_filter.pattern}"
+        for subscription_filter in filters
+    ]
+    await message.reply_text("\n".join(lines), disable_web_page_preview=True)
+
+
+async def clear_filters_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    message = update.message if update.message else update.channel_post
+    args = command_args(update, context)
+    if not args:
+        await message.reply_text(
+            f"You didn't provide a DID or handle, such as someone.bsky.social."
+            f"\n\nUsage: /clearfilters someone.bsky.social"
+        )
+        return
+    did, handle = await resolve_account(args[0])
+    if did is None:
+        await message.reply_text(f"User not found: {args[0]}")
+        return
+    sql_session: AsyncSession
+    async with async_session() as sql_session:
+        await sql_session.execute(
+            delete(SubscriptionFilter)
+            .where(SubscriptionFilter.chat_id == message.chat_id)
+            .where(SubscriptionFilter.did == did)
+        )
+        await sql_session.commit()
+    await message.reply_text(f"Removed all filters; you'll receive every post of {handle} again.")
+
+
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     message = update.message if update.message else update.channel_post
     message_arg: Optional[List[str]] = None
@@ -193,17 +505,10 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
     user_name = " ".join(message_arg)
-    primary_credentials = BlueSkyCredentials(
-        user_name=os.environ.get("OBSERVER_LOGIN"),
-        password=os.environ.get("OBSERVER_PASSWORD")
-    )
-    secondary_credentials = BlueSkyCredentials(
-        user_name=os.environ.get("OBSERVER_LOGIN_ALTERNATIVE"),
-        password=os.environ.get("OBSERVER_PASSWORD_ALTERNATIVE")
+    response = await credential_pool().run(
+        lambda credentials: find_users(user_name, credentials=credentials),
+        Operation.LOGIN, Operation.SEARCH
     )
-    response = await find_users(user_name, credentials=primary_credentials)
-    if response is None:
-        response = await find_users(user_name, credentials=secondary_credentials)
     if response is None:
         await message.reply_text("Search is unfortunately unavailable right now. Try again later.")
         return
@@ -234,10 +539,28 @@ async def info_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
              "\n\n"
              "/follow <code>userhandle</code>: Follow a user with the provided BlueSky handle."
              "\n"
+             "/followmany <code>userhandle userhandle ...</code>: Follow many users at once. Also accepts the URL of "
+             "a BlueSky list or starter pack to follow all of its members."
+             "\n"
              "/unfollow <code>userhandle</code>: Unfollow a user with the provided BlueSky handle."
              "\n"
              "/unfollowall: Unfollow all"
              "\n"
+             "/digest <code>userhandle</code> <code>minutes</code>: Receive the posts of a user as a single text "
+             f"message every few minutes (defaults to {DEFAULT_DIGEST_INTERVAL_MINUTES}) instead of one message per "
+             "post."
+             "\n"
+             "/instant <code>userhandle</code>: Receive every post of a user right away again."
+             "\n"
+             "/filter <code>userhandle</code> <code>keyword</code>: Only receive the posts of a user containing any "
+             "of the keywords set this way."
+             "\n"
+             "/filterregex <code>userhandle</code> <code>expression</code>: As above, with a regular expression."
+             "\n"
+             "/filters: List your filters."
+             "\n"
+             "/clearfilters <code>userhandle</code>: Receive every post of a user again."
+             "\n"
              "/following: List the users you are currently following."
              "\n"
              "/post: Get the text of the provided post URL. If the provided URL is a response, the URL of the parent's "
@@ -265,10 +588,24 @@ async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
     if update.channel_post.text.startswith("/following"):
         return await list_subscriptions_command(update, context)
+    if update.channel_post.text.startswith("/followmany"):
+        return await bulk_subscribe_command(update, context)
     if update.channel_post.text.startswith("/follow"):
         return await subscribe_command(update, context)
     if update.channel_post.text.startswith("/unfollow"):
         return await unsubscribe_command(update, context)
+    if update.channel_post.text.startswith("/digest"):
+        return await digest_command(update, context)
+    if update.channel_post.text.startswith("/instant"):
+        return await instant_command(update, context)
+    if update.channel_post.text.startswith("/filterregex"):
+        return await filter_regex_command(update, context)
+    if update.channel_post.text.startswith("/filters"):
+        return await list_filters_command(update, context)
+    if update.channel_post.text.startswith("/filter"):
+        return await filter_command(update, context)
+    if update.channel_post.text.startswith("/clearfilters"):
+        return await clear_filters_command(update, context)
     if update.channel_post.text.startswith("/find"):
         return await search_command(update, context)
     if update.channel_post.text.startswith("/post"):
@@ -280,18 +617,22 @@ async def handle_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if update.channel_post.text == "/start":
         return await info_command(update, context)
 
-def manage_subscriptions():
-    global engine, async_session
-    engine = create_async_engine(os.environ.get("SQLALCHEMY_URL"))
-    async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
-    asyncio.set_event_loop(loop=event_loop)
+def setup_subscription_management(
+        session_maker: sessionmaker,
+        directory: HandleDirectory,
+        index: Optional[SubscriberIndex] = None
+):
+    global async_session, handle_directory, subscriber_index
+    async_session = session_maker
+    handle_directory = directory
+    subscriber_index = index
 
-    current_dir_path = os.path.dirname(os.path.realpath(__file__))
-    event_loop.run_until_complete(
-        run_migrations_async(f"{current_dir_path}/alembic", os.environ.get("SQLALCHEMY_URL"))
-    )
 
-    tg_application = Application.builder().token(os.environ.get("TELEGRAM_API_KEY")).build()
+def build_application() -> Application:
+    tg_application_builder = Application.builder().token(os.environ.get("TELEGRAM_API_KEY"))
+    if os.environ.get("TELEGRAM_API_BASE_URL"):
+        tg_application_builder = tg_application_builder.base_url(os.environ.get("TELEGRAM_API_BASE_URL"))
+    tg_application = tg_application_builder.build()
     tg_application.add_handler(
         MessageHandler(
             filters=telegram.ext.filters.UpdateType.CHANNEL_POST,
@@ -299,12 +640,90 @@ def manage_subscriptions():
         )
     )
     tg_application.add_handler(CommandHandler("follow", subscribe_command))
+    tg_application.add_handler(CommandHandler("followmany", bulk_subscribe_command))
     tg_application.add_handler(CommandHandler("find", search_command))
+    tg_application.add_handler(CommandHandler("digest", digest_command))
+    tg_application.add_handler(CommandHandler("instant", instant_command))
+    tg_application.add_handler(CommandHandler("filter", filter_command))
+    tg_application.add_handler(CommandHandler("filterregex", filter_regex_command))
+    tg_application.add_handler(CommandHandler("filters", list_filters_command))
+    tg_application.add_handler(CommandHandler("clearfilters", clear_filters_command))
     tg_application.add_handler(CommandHandler("unfollow", unsubscribe_command))
     tg_application.add_handler(CommandHandler("following", list_subscriptions_command))
     tg_application.add_handler(CommandHandler("unfollowall", unsubscribe_all_command))
     tg_application.add_handler(CommandHandler("info", info_command))
     tg_application.add_handler(CommandHandler("post", get_post_info_command))
     tg_application.add_handler(CommandHandler("start", info_command))
-    asyncio.create_task(tg_application.run_polling(allowed_updates=Update.ALL_TYPES))
+    return tg_application
+
+
+def manage_subscriptions():
+    global engine
+    engine = create_async_engine(os.environ.get("SQLALCHEMY_URL"))
+    session_maker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    directory = HandleDirectory(session_maker)
+    setup_subscription_management(session_maker, directory)
+    asyncio.set_event_loop(loop=event_loop)
+
+    current_dir_path = os.path.dirname(os.path.realpath(__file__))
+    event_loop.run_until_complete(
+        run_migrations_async(f"{current_dir_path}/alembic", os.environ.get("SQLALCHEMY_URL"))
+    )
+    event_loop.run_until_complete(directory.load())
+
+    tg_application = build_application()
+    if os.environ.get("TELEGRAM_WEBHOOK_PORT"):
+        event_loop.run_until_complete(receive_updates_via_webhook(tg_application))
+    else:
+        asyncio.create_task(tg_application.run_polling(allowed_updates=Update.ALL_TYPES))
+
+
+async def receive_updates(tg_application: Application):
+    """ Receives updates on the already running event loop, e.g. alongside of the distribution """
+    if os.environ.get("TELEGRAM_WEBHOOK_PORT"):
+        await receive_updates_via_webhook(tg_application)
+        return
+    await tg_application.initialize()
+    await tg_application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+    await tg_application.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await tg_application.updater.stop()
+        await tg_application.stop()
+        await tg_application.shutdown()
+
+
+async def receive_updates_via_webhook(tg_application: Application):
+    secret_token = os.environ.get("TELEGRAM_WEBHOOK_SECRET")
+    webhook_url = os.environ.get("TELEGRAM_WEBHOOK_URL")
+    if not secret_token:
+        if not webhook_url:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is mandatory if TELEGRAM_WEBHOOK_URL isn't set")
+        # only Telegram needs to know it, which is told along with the URL
+        secret_token = secrets.token_urlsafe(32)
+        logging.info("No TELEGRAM_WEBHOOK_SECRET set; registering the webhook with a generated one")
+    server = TelegramWebhookServer(
+        tg_application,
+        secret_token=secret_token,
+        max_workers=int(os.environ.get("TELEGRAM_WEBHOOK_WORKERS", "8"))
+    )
+    await tg_application.initialize()
+    await tg_application.start()
+    await server.start(
+        host=os.environ.get("TELEGRAM_WEBHOOK_LISTEN", "0.0.0.0"),
+        port=int(os.environ.get("TELEGRAM_WEBHOOK_PORT"))
+    )
+    if webhook_url:
+        await tg_application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES
+        )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await tg_application.stop()
+        await tg_application.shutdown()
 
@@ -0,0 +1,71 @@
+import asyncio
+import hmac
+import logging
+from typing import Optional, Set
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramWebhookServer:
+    """ Receives Telegram updates via HTTP POST and dispatches them to the application's handlers.
+
+    Updates are acknowledged right away and processed concurrently by at most max_workers handlers at once,
+    so that a slow command (e.g. /followmany) doesn't hold up any other chat. Every request has to present
+    secret_token, as the server is usually reachable from anywhere. """
+
+    def __init__(
+            self,
+            application: Application,
+            secret_token: str,
+            path: str = "/telegram",
+            max_workers: int = 8
+    ):
+        if not secret_token:
+            raise ValueError("The webhook requires a secret token")
+        self._application = application
+        self._secret_token = secret_token
+        self._path = path
+        self._workers = asyncio.Semaphore(max_workers)
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+                request.headers.get(SECRET_TOKEN_HEADER, "").encode("utf-8"), self._secret_token.encode("utf-8")
+        ):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), self._application.bot)
+        except Exception as e:
+            logging.warning(f"Received malformed update: {e}")
+            return web.Response(status=400)
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update):
+        async with self._workers:
+            try:
+                await self._application.process_update(update)
+            except Exception as e:
+                logging.exception(f"Processing update {update.update_id} failed", exc_info=e)
+
+    async def start(self, host: str, port: int):
+        app = web.Application()
+        app.router.add_post(self._path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host=host, port=port).start()
+        logging.info(f"Listening for Telegram updates on {host}:{port}{self._path}")
+
+    async def stop(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
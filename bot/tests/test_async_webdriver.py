@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from selenium.common import TimeoutException
+
+from async_webdriver import AsyncWebDriver
+
+
+class SleepingDriver:
+    """ Stands in for a WebDriver session whose page loads block like the real ones do """
+
+    def __init__(self, page_load_s: float):
+        self.page_load_s = page_load_s
+        self.quit_on = None
+
+    def get(self, url: str):
+        time.sleep(self.page_load_s)
+
+    def get_screenshot_as_png(self) -> bytes:
+        return b"\x89PNG"
+
+    def quit(self):
+        self.quit_on = threading.current_thread().name
+
+
+async def max_loop_lag_s(coroutine, interval_s: float = 0.01) -> float:
+    """ Awaits coroutine and returns how much longer than interval_s the event loop took at most to wake up """
+    max_lag_s = 0.0
+
+    async def monitor():
+        nonlocal max_lag_s
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(interval_s)
+            max_lag_s = max(max_lag_s, time.perf_counter() - started_at - interval_s)
+
+    monitor_task = asyncio.create_task(monitor())
+    try:
+        await coroutine
+    finally:
+        monitor_task.cancel()
+    return max_lag_s
+
+
+def test_event_loop_keeps_running_while_the_driver_blocks():
+    async def screenshots():
+        browser = await AsyncWebDriver.create(lambda: SleepingDriver(page_load_s=0.5))
+        try:
+            for index in range(3):
+                await browser.get(f"https://bsky.app/profile/did:plc:test/post/{index}")
+                assert await browser.screenshot_as_png() == b"\x89PNG"
+        finally:
+            await browser.quit()
+
+    assert asyncio.run(max_loop_lag_s(screenshots())) < 0.1
+
+
+def test_timed_out_session_is_broken_and_quit_from_another_thread():
+    async def hang():
+        driver = SleepingDriver(page_load_s=1.0)
+        browser = await AsyncWebDriver.create(lambda: driver, timeout_s=0.1)
+        with pytest.raises(TimeoutException):
+            await browser.get("https://bsky.app")
+        assert browser.broken
+        started_at = time.perf_counter()
+        await browser.quit(timeout_s=0.5)
+        assert time.perf_counter() - started_at < 0.5
+        assert driver.quit_on is not None and driver.quit_on.startswith("webdriver-quit")
+
+    asyncio.run(hang())
@@ -0,0 +1,61 @@
+import re
+import time
+
+import pytest
+
+from model.subscription_filter import SubscriptionFilter
+from subscription_filters import SubscriptionFilters, compile_filter_expression
+
+HOSTILE_PATTERNS = [
+    r"(a+)+$",
+    r"(a*)*b",
+    r"(\w+\s?)*$",
+    r"(x+x+)+y",
+    r"(a|a?)+$",
+    r"(?:(a+)|b)*c",
+]
+
+
+def test_parser_api_is_available():
+    # compile_filter_expression relies on the parser re uses internally, which isn't part of its public API
+    from subscription_filters import sre_constants, sre_parse
+    (op, (minimum, maximum, body)), = list(sre_parse.parse(r"(a+)+"))
+    assert op == sre_constants.MAX_REPEAT and (minimum, maximum) == (1, sre_constants.MAXREPEAT)
+    assert isinstance(body, sre_parse.SubPattern)
+
+
+@pytest.mark.parametrize("pattern", HOSTILE_PATTERNS)
+def test_rejects_patterns_that_backtrack_catastrophically(pattern):
+    with pytest.raises(re.error):
+        compile_filter_expression(pattern)
+
+
+@pytest.mark.parametrize("pattern", [
+    r"climate (change|crisis)",
+    r"(cat|dog)+",
+    r"\bnews\b",
+    r"https?://\S+",
+    r"(\d{3}-)+\d{4}",
+    r"(\w+)\s(\w+)!",
+    r"foo.*bar",
+    r".*foo.*bar",
+    r"(a|aa)+",
+])
+def test_accepts_common_patterns(pattern):
+    assert isinstance(compile_filter_expression(pattern), re.Pattern)
+
+
+def test_ignores_stored_hostile_patterns():
+    filters = SubscriptionFilters()
+    filters.update({"did:plc:a"}, [
+        SubscriptionFilter(chat_id=1, did="did:plc:a", pattern=r"(a+)+$", is_regex=True),
+        SubscriptionFilter(chat_id=2, did="did:plc:a", pattern=r"clim(ate|bing)", is_regex=True),
+        SubscriptionFilter(chat_id=3, did="did:plc:a", pattern="aaa", is_regex=False),
+    ])
+    started_at = time.perf_counter()
+    matching_chats = filters.matching_chats("did:plc:a", "a" * 3000 + "!")
+    assert time.perf_counter() - started_at < 1.0
+    assert matching_chats == {3}
+    assert filters.matching_chats("did:plc:a", "Climbing season") == {2}
+    # the chat with the rejected filter still only receives matching posts, i.e. none
+    assert 1 in filters.filtered_chats("did:plc:a")